@@ -1,17 +1,34 @@
+import os
 import sys
 import asyncio
-import aiohttp
-import websockets
 import cv2
-import numpy as np
-from PyQt5 import uic, QtGui, QtCore
+from PyQt5 import uic, QtCore
 from PyQt5.QtWidgets import QApplication, QWidget
 from qasync import QEventLoop, asyncSlot
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.connection import ConnectionManager  # noqa: E402
+from common.frame_source import MjpegHttpSource, open_source  # noqa: E402
+from common.frame_worker import FrameWorker  # noqa: E402
+from common.latency import LatencyTracker  # noqa: E402
+from common.renderer import FrameRenderer  # noqa: E402
+import line_detection  # noqa: E402
+from line_detection import ANGLE_THRESHOLD  # noqa: E402
+from steering import SteeringController  # noqa: E402
+
 ESP32_WS_URL = "ws://192.168.31.81:81/ws"       # ЗАМІНІТЬ НА СВІЙ
 ESP32_VIDEO_URL = "http://192.168.31.81/video"  # ЗАМІНІТЬ НА СВІЙ
+VIDEO_SOURCE = ESP32_VIDEO_URL  # or a video file, a folder of JPEGs, "synthetic"
+
+LATENCY_OVERLAY = False  # draw per-stage latency percentiles on the video
+LATENCY_EXPORT = None    # e.g. "latency.csv" or "latency.jsonl"
+
+SMOOTH_STEERING = True    # filtered angle, hysteresis and a minimum dwell instead of per-frame decisions
+STEERING_FILTER = "ema"   # "ema" or "kalman"
+MIN_DWELL = 0.3           # seconds a command is kept before the next change
 
-ANGLE_THRESHOLD = 0.15  # Радіан ~ 8.5 градусів
+FAST_PATH = True     # Grayscale reduced decode, ROI-only processing
+FAST_PATH_SCALE = 2  # Decode at 1/2, 1/4 or 1/8 of the camera resolution
 
 
 class VideoControl(QWidget):
@@ -31,158 +48,138 @@ class VideoControl(QWidget):
         self.start_drive_button.clicked.connect(self.start_autonomous_drive)
         self.stop_drive_button.clicked.connect(self.stop_autonomous_drive)
 
-        self.ws = None
+        self.connection = ConnectionManager(
+            ESP32_WS_URL, on_message=lambda msg: self.append_log(f"ESP32: {msg}"), log=self.append_log)
         self.video_task = None
         self.stream_active = False
         self.autonomous_drive = False
-        self.latest_frame = None
+        self.show_video = True  # no debug frames while minimized
+        self.video_source = open_source(VIDEO_SOURCE)
+        self.latency = LatencyTracker(export_path=LATENCY_EXPORT, end_stage="paint")
+        self.renderer = FrameRenderer(self.video_label, on_done=self.latency.record)
+        self.frame_worker = FrameWorker(self.decode_frame, on_error=lambda e: self.append_log(f"Frame error: {e}"))
         self.last_command = None
-        asyncio.ensure_future(self.connect_ws_loop())
+        self.steering = None
+        if SMOOTH_STEERING:
+            self.steering = SteeringController(ANGLE_THRESHOLD, filter=STEERING_FILTER, min_dwell=MIN_DWELL)
+        self.connection.start()
 
     def append_log(self, msg):
         self.log_view.appendPlainText(f"[{QtCore.QTime.currentTime().toString()}] {msg}")
 
-    async def connect_ws_loop(self):
-        while True:
-            if self.ws is None or self.ws.closed:
-                try:
-                    self.ws = await websockets.connect(ESP32_WS_URL)
-                    self.append_log("Connected to WebSocket")
-                    asyncio.ensure_future(self.receive_ws())
-                except Exception as e:
-                    self.append_log(f"WebSocket error: {e}")
-            await asyncio.sleep(0.5)
-
-    async def receive_ws(self):
-        try:
-            async for message in self.ws:
-                self.append_log(f"ESP32: {message}")
-        except Exception as e:
-            self.append_log(f"WebSocket lost: {e}")
-            self.ws = None
-
     @asyncSlot()
     async def toggle_video(self, enable):
-        if not self.ws or self.ws.closed:
+        # Offline sources (file, folder, synthetic) do not need the ESP32
+        live = isinstance(self.video_source, MjpegHttpSource)
+        if live and not self.connection.connected:
             self.append_log("WebSocket not connected")
             return
-        try:
-            await self.ws.send("start" if enable else "stop")
-            self.stream_active = enable
-            if enable:
-                if self.video_task:
-                    self.video_task.cancel()
-                self.video_task = asyncio.ensure_future(self.video_stream_task())
-            else:
-                if self.video_task:
-                    self.video_task.cancel()
-                self.video_label.clear()
-                self.latest_frame = None
-        except Exception as e:
-            self.append_log(f"WebSocket send error: {e}")
+        if live and not await self.connection.send("start" if enable else "stop"):
+            self.append_log("Stream command not sent")
+            return
+        self.stream_active = enable
+        if enable:
+            if self.video_task:
+                self.video_task.cancel()
+            self.video_task = asyncio.ensure_future(self.video_stream_task())
+        else:
+            if self.video_task:
+                self.video_task.cancel()
+            self.renderer.clear()
 
     async def video_stream_task(self):
+        consumer = asyncio.ensure_future(self.frame_consumer_task())
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(ESP32_VIDEO_URL) as resp:
-                    if resp.status != 200:
-                        self.append_log(f"HTTP error: {resp.status}")
-                        return
-
-                    buffer = b""
-                    while self.stream_active:
-                        chunk = await resp.content.read(4096)
-                        if not chunk:
-                            break
-                        buffer += chunk
-
-                        start = buffer.find(b'\xff\xd8')
-                        end = buffer.find(b'\xff\xd9', start)
-                        if start != -1 and end != -1:
-                            jpeg = buffer[start:end + 2]
-                            buffer = buffer[end + 2:]
-
-                            img_np = np.frombuffer(jpeg, np.uint8)
-                            frame = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
-                            if frame is not None:
-                                command, debug_frame = self.process_frame(frame)
-                                if self.autonomous_drive and command and command != self.last_command:
-                                    await self.send_drive_command(command)
-                                    self.last_command = command
-
-                                frame_rgb = cv2.cvtColor(debug_frame, cv2.COLOR_BGR2RGB)
-                                self.latest_frame = QtGui.QImage(
-                                    frame_rgb.data,
-                                    frame_rgb.shape[1],
-                                    frame_rgb.shape[0],
-                                    frame_rgb.strides[0],
-                                    QtGui.QImage.Format_RGB888
-                                )
-                                self.update_frame()
+            async for frame in self.connection.stream(self.video_source):
+                if not self.stream_active:
+                    break
+                # The worker always takes the newest frame, older ones are stale
+                self.frame_worker.submit(frame)
         except Exception as e:
             self.append_log(f"Video error: {e}")
         finally:
+            consumer.cancel()
+            self.frame_worker.reset()
+            self.append_log(self.frame_worker.stats())
+            self.append_log(self.renderer.stats())
+            self.append_log(self.connection.stats())
+            if self.steering:
+                self.append_log(self.steering.stats())
+            if self.latency.recorded:
+                self.append_log(self.latency.summary())
             self.stream_active = False
+            self.renderer.clear()
             self.video_label.setText("Stream stopped")
 
-    def process_frame(self, frame):
-        debug_frame = frame.copy()
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blur, 45, 80)
-
-        height, width = edges.shape
-        roi = edges[int(height/2):, :]
-
-        lines = cv2.HoughLinesP(roi, 1, np.pi/180, 30, minLineLength=20, maxLineGap=20)
-        angle_sum = 0
-        count = 0
-
-        if lines is not None:
-            offset_y = int(height / 2)
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                y1 += offset_y
-                y2 += offset_y
-                cv2.line(debug_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                angle = np.arctan2(y2 - y1, x2 - x1)
-                angle_sum += angle
-                count += 1
-
-        if count == 0:
-            return ("halt" if self.autonomous_drive and self.last_command != "halt" else None), debug_frame
-
-        avg_angle = angle_sum / count
-
-        if avg_angle > ANGLE_THRESHOLD:
-            return "a", debug_frame
-        elif avg_angle < -ANGLE_THRESHOLD:
-            return "d", debug_frame
+    async def frame_consumer_task(self):
+        try:
+            async for frame, (command, image) in self.frame_worker.results():
+                if self.autonomous_drive and command and command != self.last_command:
+                    # A command that was not written is retried on the next frame
+                    if await self.send_drive_command(command):
+                        self.last_command = command
+                        frame.mark("send")
+
+                if image is None:
+                    self.latency.record(frame)
+                    continue
+                self.renderer.set_frame(image, frame)
+        except Exception as e:
+            self.append_log(f"Frame worker error: {e}")
+            # Nothing is drawn or steered any more, so end the stream instead of feeding a dead consumer
+            self.stream_active = False
+
+    def decode_frame(self, frame):
+        # Runs in the frame worker thread
+        if FAST_PATH:
+            gray = frame.decode_gray(FAST_PATH_SCALE)
+            if gray is None:
+                return None
+            frame.mark("decode")
+            # The debug overlay is built only while the video is visible
+            command, debug_frame = line_detection.process_gray_fast(
+                gray, FAST_PATH_SCALE, debug=self.show_video, angle_threshold=ANGLE_THRESHOLD,
+                controller=self.steering)
         else:
-            return "w", debug_frame
+            image = frame.decode()
+            if image is None:
+                return None
+            frame.mark("decode")
+            command, debug_frame = self.process_frame(image)
+        frame.mark("vision")
+
+        if command is None:
+            command = "halt" if self.autonomous_drive and self.last_command != "halt" else None
+        if debug_frame is None:
+            return command, None
+        if self.steering:
+            cv2.putText(debug_frame, f"steer {self.steering.steering:+.2f}", (5, 15),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)
+        image = cv2.cvtColor(debug_frame, cv2.COLOR_BGR2RGB)
+        if LATENCY_OVERLAY:
+            self.latency.draw_overlay(image)
+        return command, image
 
-    def update_frame(self):
-        if self.latest_frame and not self.latest_frame.isNull():
-            pix = QtGui.QPixmap.fromImage(self.latest_frame).scaled(
-                self.video_label.size(),
-                QtCore.Qt.KeepAspectRatio,
-                QtCore.Qt.SmoothTransformation
-            )
-            self.video_label.setPixmap(pix)
+    def process_frame(self, frame):
+        return line_detection.process_frame(frame, ANGLE_THRESHOLD, self.steering)
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self.latest_frame is not None:
-            QtCore.QTimer.singleShot(30, self.update_frame)
+        self.renderer.resize()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QtCore.QEvent.WindowStateChange:
+            self.show_video = not self.isMinimized()
 
     def closeEvent(self, event):
         self.stream_active = False
         self.autonomous_drive = False
         if self.video_task:
             self.video_task.cancel()
-        if self.ws:
-            asyncio.ensure_future(self.ws.close())
+        asyncio.ensure_future(self.connection.close())
+        self.frame_worker.shutdown()
+        self.latency.close()
         event.accept()
 
     def start_autonomous_drive(self):
@@ -197,14 +194,11 @@ class VideoControl(QWidget):
         self.append_log("Autonomous drive stopped")
 
     async def send_drive_command(self, key):
-        if not self.ws or self.ws.closed:
-            return
-        if key in {"w", "a", "s", "d", "halt"}:
-            try:
-                await self.ws.send(key)
-                self.append_log(f"Sent command: {key}")
-            except Exception as e:
-                self.append_log(f"Send error: {e}")
+        """True once `key` is written to the WebSocket."""
+        if key not in {"w", "a", "s", "d", "halt"} or not await self.connection.send(key):
+            return False
+        self.append_log(f"Sent command: {key}")
+        return True
 
 
 def main():
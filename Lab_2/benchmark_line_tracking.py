@@ -0,0 +1,135 @@
+import os
+import sys
+import glob
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import line_detection  # noqa: E402
+
+
+def synthetic_frames(count, width=320, height=240, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        frame = rng.integers(110, 126, size=(height, width, 3), dtype=np.uint8)
+        # One dark line swinging left and right in front of the robot
+        shift = int(120 * np.sin(i / 10.0))
+        cv2.line(frame, (width // 2, height), (width // 2 + shift, height // 3), (20, 20, 20), 6)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        frames.append(jpeg.tobytes())
+    return frames
+
+
+def load_jpegs(directory):
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jp*g"))):
+        with open(path, "rb") as f:
+            frames.append(f.read())
+    return frames
+
+
+def run_full(jpeg):
+    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    return line_detection.process_frame(frame)[0]
+
+
+def steering_command_loop(lines, angle_threshold=line_detection.ANGLE_THRESHOLD):
+    """The former per-segment loop (unweighted mean angle), kept as the reference."""
+    angle_sum = 0
+    count = 0
+    for x1, y1, x2, y2 in lines.reshape(-1, 4):
+        angle_sum += np.arctan2(y2 - y1, x2 - x1)
+        count += 1
+    avg_angle = angle_sum / count
+    if avg_angle > angle_threshold:
+        return "a"
+    elif avg_angle < -angle_threshold:
+        return "d"
+    return "w"
+
+
+def draw_lines_loop(image, lines, offset_y=0):
+    for x1, y1, x2, y2 in lines.reshape(-1, 4):
+        cv2.line(image, (x1, y1 + offset_y), (x2, y2 + offset_y), (0, 255, 0), 2)
+    return image
+
+
+def busy_lines(count, width=320, height=120, seed=0):
+    """HoughLinesP-shaped (N, 1, 4) int32 segments, as on a cluttered floor."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, (width, height, width, height), size=(count, 1, 4)).astype(np.int32)
+
+
+def time_call(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000.0 / repeats
+
+
+def segment_benchmark(counts, repeats):
+    """Per-segment Python loops vs the vectorized aggregation and one cv2.polylines call."""
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    for count in counts:
+        lines = busy_lines(count)
+        loop = time_call(lambda: steering_command_loop(lines), repeats)
+        vectorized = time_call(lambda: line_detection.steering_command(lines, weighted=False), repeats)
+        weighted = time_call(lambda: line_detection.steering_command(lines), repeats)
+        stats = time_call(lambda: line_detection.lane_stats(lines, 320), repeats)
+        draw_loop = time_call(lambda: draw_lines_loop(image, lines, 120), repeats)
+        draw_batched = time_call(lambda: line_detection.draw_lines(image, lines, 120), repeats)
+        print(f"{count:5d} segments: steering loop {loop:.3f} ms, vectorized {vectorized:.3f} ms "
+              f"(x{loop / vectorized:.1f}), length-weighted {weighted:.3f} ms, left/right stats {stats:.3f} ms; "
+              f"drawing cv2.line loop {draw_loop:.3f} ms, polylines {draw_batched:.3f} ms "
+              f"(x{draw_loop / draw_batched:.1f})")
+
+
+def time_pipeline(name, fn, frames, repeats):
+    fn(frames[0])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for jpeg in frames:
+            fn(jpeg)
+    per_frame = (time.perf_counter() - start) * 1000.0 / (repeats * len(frames))
+    print(f"{name:<28} {per_frame:7.3f} ms/frame  {1000.0 / per_frame:7.1f} fps")
+    return per_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 2 line tracking: full vs fast pipeline")
+    parser.add_argument("--frames", help="directory with recorded JPEG frames (default: synthetic QVGA)")
+    parser.add_argument("--count", type=int, default=100, help="number of synthetic frames")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--segments", type=int, nargs="*",
+                        help="only the steering/drawing micro-benchmark on N random segments, e.g. 50 300 1000")
+    args = parser.parse_args()
+
+    if args.segments:
+        segment_benchmark(args.segments, max(args.repeats, 200))
+        return
+
+    frames = load_jpegs(args.frames) if args.frames else synthetic_frames(args.count)
+    if not frames:
+        sys.exit("No frames to benchmark")
+    print(f"{len(frames)} frames x {args.repeats} repeats")
+
+    full = time_pipeline("full BGR + debug frame", run_full, frames, args.repeats)
+    for scale in (1, 2):
+        fast = time_pipeline(f"fast gray 1/{scale}",
+                             lambda jpeg: line_detection.process_jpeg_fast(jpeg, scale=scale),
+                             frames, args.repeats)
+        print(f"{'':<28} speed-up x{full / fast:.2f}")
+    time_pipeline("fast gray 1/2 + debug", lambda jpeg: line_detection.process_jpeg_fast(jpeg, debug=True),
+                  frames, args.repeats)
+
+    agree = sum(run_full(jpeg) == line_detection.process_jpeg_fast(jpeg)[0] for jpeg in frames)
+    print(f"Same steering command as the full pipeline: {agree}/{len(frames)} frames")
+
+
+if __name__ == "__main__":
+    main()
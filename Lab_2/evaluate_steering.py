@@ -0,0 +1,106 @@
+"""Command churn of per-frame steering vs the smoothed SteeringController.
+
+    python evaluate_steering.py                        # synthetic noisy run
+    python evaluate_steering.py --frames runs/track1 --fps 15 --speed 0.25
+
+Replays recorded JPEG frames (or a synthetic line with a slow S-curve,
+per-frame jitter, floor clutter and short gaps) at `--fps`, feeds both
+deciders the same Hough segments and counts how often the command changes,
+per 100 frames and per meter at `--speed` m/s. Frames without lines send "halt", as in the
+drive loop, so halt/drive flips count as changes too.
+"""
+import os
+import sys
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import line_detection  # noqa: E402
+from benchmark_line_tracking import load_jpegs  # noqa: E402
+from steering import SteeringController  # noqa: E402
+
+
+def noisy_frames(count, width=320, height=240, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        frame = rng.integers(110, 126, size=(height, width, 3), dtype=np.uint8)
+        # A gentle S-curve around the threshold, shaken by vibration and blur
+        shift = int(45 * np.sin(i / 40.0) + rng.normal(0, 14))
+        if rng.random() > 0.03:  # the rest are gaps in the tape or glare
+            cv2.line(frame, (width // 2, height), (width // 2 + shift, height // 3), (20, 20, 20), 6)
+        for _ in range(rng.integers(0, 4)):
+            x, y = rng.integers(0, width), rng.integers(height // 2, height)
+            dx, dy = rng.integers(-30, 30, size=2)
+            cv2.line(frame, (x, y), (x + dx, y + dy), (60, 60, 60), 2)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        frames.append(jpeg.tobytes())
+    return frames
+
+
+def segments(jpeg, scale=2):
+    """Hough segments and frame width of the fast path."""
+    gray = cv2.imdecode(np.frombuffer(jpeg, np.uint8), line_detection.REDUCED_GRAYSCALE[scale])
+    lines = line_detection.hough_lines(line_detection.edge_map(gray[gray.shape[0] // 2:, :]), scale)
+    return lines, gray.shape[1]
+
+
+class Churn:
+    def __init__(self):
+        self.sent = None
+        self.changes = 0
+        self.halts = 0
+        self.commands = 0
+
+    def add(self, command):
+        command = command or "halt"
+        self.commands += 1
+        if self.sent is not None and command != self.sent:
+            self.changes += 1
+            self.halts += command == "halt"
+        self.sent = command
+
+
+def evaluate(frames, fps, controller, angle_threshold):
+    raw, smooth = Churn(), Churn()
+    for i, jpeg in enumerate(frames):
+        lines, width = segments(jpeg)
+        raw.add(line_detection.steering_command(lines, angle_threshold))
+        smooth.add(controller.update(lines, width, now=i / fps))
+    return raw, smooth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", help="directory with recorded JPEG frames (default: synthetic)")
+    parser.add_argument("--count", type=int, default=600, help="number of synthetic frames")
+    parser.add_argument("--fps", type=float, default=15.0, help="frame rate of the run")
+    parser.add_argument("--speed", type=float, default=0.25, help="robot speed, m/s")
+    parser.add_argument("--angle-threshold", type=float, default=line_detection.ANGLE_THRESHOLD)
+    parser.add_argument("--filter", default="ema", choices=("ema", "kalman"))
+    parser.add_argument("--alpha", type=float, default=0.3, help="EMA weight of the new sample")
+    parser.add_argument("--min-dwell", type=float, default=0.3, help="seconds")
+    parser.add_argument("--release", type=float, default=0.5, help="turn ends below this share of the threshold")
+    parser.add_argument("--offset-gain", type=float, default=0.0)
+    args = parser.parse_args()
+
+    frames = load_jpegs(args.frames) if args.frames else noisy_frames(args.count)
+    if not frames:
+        sys.exit("No frames to evaluate")
+    controller = SteeringController(args.angle_threshold, release=args.release, min_dwell=args.min_dwell,
+                                    filter=args.filter, alpha=args.alpha, offset_gain=args.offset_gain)
+    raw, smooth = evaluate(frames, args.fps, controller, args.angle_threshold)
+
+    meters = len(frames) / args.fps * args.speed
+    print(f"{len(frames)} frames at {args.fps:g} fps, {meters:.1f} m at {args.speed:g} m/s")
+    for name, churn in (("per-frame threshold", raw), (f"{args.filter} + hysteresis + dwell", smooth)):
+        per_100 = churn.changes / len(frames) * 100
+        per_meter = churn.changes / meters if meters else 0.0
+        print(f"{name:<30} {churn.changes:4d} changes ({churn.halts} to halt)  {per_100:5.1f} per 100 frames  "
+              f"{per_meter:5.1f} per m")
+
+
+if __name__ == "__main__":
+    main()
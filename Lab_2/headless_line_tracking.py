@@ -0,0 +1,72 @@
+"""Autonomous line tracking without the GUI (e.g. over SSH on a companion computer).
+
+    python headless_line_tracking.py --ws-url ws://192.168.31.81:81/ws --source http://192.168.31.81/video
+
+Runs the same stream -> line detection -> WebSocket command loop as the
+autonomous drive of GUI_line_tracking.py and prints throughput periodically.
+"""
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.headless import HeadlessRunner, add_common_args, run  # noqa: E402
+import line_detection  # noqa: E402
+from steering import SteeringController  # noqa: E402
+
+ESP32_WS_URL = "ws://192.168.31.81:81/ws"       # ЗАМІНІТЬ НА СВІЙ
+ESP32_VIDEO_URL = "http://192.168.31.81/video"  # ЗАМІНІТЬ НА СВІЙ
+
+
+def make_process(args, controller=None):
+    def process(frame):
+        # Runs in the frame worker thread
+        if args.full:
+            image = frame.decode()
+            if image is None:
+                return None
+            frame.mark("decode")
+            command, _ = line_detection.process_frame(image, args.angle_threshold, controller)
+        else:
+            gray = frame.decode_gray(args.scale)
+            if gray is None:
+                return None
+            frame.mark("decode")
+            command, _ = line_detection.process_gray_fast(
+                gray, args.scale, angle_threshold=args.angle_threshold, controller=controller)
+        frame.mark("vision")
+        # No line: stop, repeated halts are dropped by the runner
+        return [command or "halt"]
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_common_args(parser, ESP32_WS_URL, ESP32_VIDEO_URL)
+    parser.add_argument("--full", action="store_true", help="full-resolution BGR pipeline instead of the fast path")
+    parser.add_argument("--scale", type=int, default=2, choices=sorted(line_detection.REDUCED_GRAYSCALE),
+                        help="fast path JPEG decode reduction")
+    parser.add_argument("--angle-threshold", type=float, default=line_detection.ANGLE_THRESHOLD,
+                        help="radians; smaller mean angle drives straight")
+    parser.add_argument("--raw-steering", action="store_true",
+                        help="per-frame threshold decisions instead of the filtered controller")
+    parser.add_argument("--filter", default="ema", choices=("ema", "kalman"), help="steering angle filter")
+    parser.add_argument("--min-dwell", type=float, default=0.3,
+                        help="seconds a command is kept before the next change")
+    parser.add_argument("--offset-gain", type=float, default=0.0,
+                        help="weight of the lateral line offset next to its angle")
+    args = parser.parse_args()
+
+    controller = None
+    if not args.raw_steering:
+        controller = SteeringController(args.angle_threshold, filter=args.filter, min_dwell=args.min_dwell,
+                                        offset_gain=args.offset_gain)
+    try:
+        run(HeadlessRunner(args, make_process(args, controller), dedupe=True))
+    finally:
+        if controller:
+            print(controller.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from common.frame_source import REDUCED_GRAYSCALE
+
+ANGLE_THRESHOLD = 0.15  # Радіан ~ 8.5 градусів
+
+# Hough parameters for a full-resolution frame, scaled down with the image
+HOUGH_THRESHOLD = 30
+MIN_LINE_LENGTH = 20
+MAX_LINE_GAP = 20
+
+
+def edge_map(gray):
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.Canny(blur, 45, 80)
+
+
+def hough_lines(edges, scale=1):
+    return cv2.HoughLinesP(edges, 1, np.pi / 180, max(1, HOUGH_THRESHOLD // scale),
+                           minLineLength=MIN_LINE_LENGTH / scale, maxLineGap=MAX_LINE_GAP / scale)
+
+
+# Segments, total length (px), length-weighted mean angle (rad) and midpoint x of one side
+LaneStats = namedtuple("LaneStats", "count length angle x")
+
+
+def segment_geometry(lines):
+    """Angles, lengths and midpoint x of the (N, 1, 4) HoughLinesP segments as (N,) arrays."""
+    segments = lines.reshape(-1, 4).astype(np.float32)
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    return np.arctan2(dy, dx), np.hypot(dx, dy), (segments[:, 0] + segments[:, 2]) * 0.5
+
+
+def _lane_stats(angles, lengths, xs):
+    total = float(lengths.sum())
+    if not len(angles) or total == 0:
+        return LaneStats(len(angles), 0.0, None, None)
+    return LaneStats(len(angles), total, float(angles @ lengths / total), float(xs @ lengths / total))
+
+
+def lane_stats(lines, width):
+    """LaneStats of all segments and of the ones left/right of the frame center: (all, left, right)."""
+    if lines is None or len(lines) == 0:
+        empty = LaneStats(0, 0.0, None, None)
+        return empty, empty, empty
+    angles, lengths, xs = segment_geometry(lines)
+    left = xs < width / 2
+    return (_lane_stats(angles, lengths, xs),
+            _lane_stats(angles[left], lengths[left], xs[left]),
+            _lane_stats(angles[~left], lengths[~left], xs[~left]))
+
+
+def mean_angle(lines, weighted=True):
+    """Mean segment angle; long segments (the line itself) outweigh short edge noise unless `weighted` is off."""
+    angles, lengths, _ = segment_geometry(lines)
+    if not weighted or lengths.sum() == 0:
+        return float(angles.mean())
+    return float(angles @ lengths / lengths.sum())
+
+
+def steering_command(lines, angle_threshold=ANGLE_THRESHOLD, weighted=True):
+    """Map Hough segments to "a"/"d"/"w", or None when there are no lines."""
+    if lines is None or len(lines) == 0:
+        return None
+
+    avg_angle = mean_angle(lines, weighted)
+    if avg_angle > angle_threshold:
+        return "a"
+    elif avg_angle < -angle_threshold:
+        return "d"
+    return "w"
+
+
+def draw_lines(image, lines, offset_y=0):
+    """All segments in one cv2.polylines call."""
+    if lines is None or len(lines) == 0:
+        return image
+    points = lines.reshape(-1, 2, 2).astype(np.int32)
+    if offset_y:
+        points[:, :, 1] += offset_y
+    cv2.polylines(image, points, False, (0, 255, 0), 2)
+    return image
+
+
+def decide(lines, width, angle_threshold=ANGLE_THRESHOLD, controller=None):
+    """Per-frame threshold decision, or the temporal one of a `steering.SteeringController`."""
+    if controller is not None:
+        return controller.update(lines, width)
+    return steering_command(lines, angle_threshold)
+
+
+def process_frame(frame, angle_threshold=ANGLE_THRESHOLD, controller=None):
+    """Full pipeline on a BGR frame, returns (command, debug_frame)."""
+    debug_frame = frame.copy()
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    edges = edge_map(gray)
+
+    height = edges.shape[0]
+    offset_y = int(height / 2)
+    lines = hough_lines(edges[offset_y:, :])
+
+    draw_lines(debug_frame, lines, offset_y)
+    return decide(lines, frame.shape[1], angle_threshold, controller), debug_frame
+
+
+def process_gray_fast(gray, scale=2, debug=False, angle_threshold=ANGLE_THRESHOLD, controller=None):
+    """Fast path on a grayscale frame reduced by `scale`, ROI crop before blur/Canny.
+
+    Returns (command, debug_frame); debug_frame is None unless `debug` is set,
+    and then it is the reduced grayscale image with the segments drawn.
+    """
+    offset_y = gray.shape[0] // 2
+    lines = hough_lines(edge_map(gray[offset_y:, :]), scale)
+    command = decide(lines, gray.shape[1], angle_threshold, controller)
+
+    debug_frame = None
+    if debug:
+        debug_frame = draw_lines(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), lines, offset_y)
+    return command, debug_frame
+
+
+def process_jpeg_fast(jpeg, scale=2, debug=False, angle_threshold=ANGLE_THRESHOLD, controller=None):
+    """Fast path straight from JPEG bytes, decoded to grayscale at 1/scale."""
+    gray = cv2.imdecode(np.frombuffer(jpeg, np.uint8), REDUCED_GRAYSCALE[scale])
+    if gray is None:
+        return None, None
+    return process_gray_fast(gray, scale, debug, angle_threshold, controller)
@@ -0,0 +1,120 @@
+import time
+
+from line_detection import ANGLE_THRESHOLD, lane_stats
+
+
+class Ema:
+    """Exponential moving average; `alpha` is the weight of the new sample."""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, sample):
+        self.value = sample if self.value is None else self.value + self.alpha * (sample - self.value)
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+
+class Kalman1D:
+    """Kalman filter of a slowly drifting value: random walk with variance `q`, measurement noise `r`."""
+
+    def __init__(self, q=0.002, r=0.02):
+        self.q = q
+        self.r = r
+        self.value = None
+        self.variance = None
+
+    def update(self, sample):
+        if self.value is None:
+            self.value, self.variance = sample, self.r
+            return self.value
+        self.variance += self.q
+        gain = self.variance / (self.variance + self.r)
+        self.value += gain * (sample - self.value)
+        self.variance *= 1.0 - gain
+        return self.value
+
+    def reset(self):
+        self.value = None
+        self.variance = None
+
+
+def make_filter(kind="ema", alpha=0.3, q=0.002, r=0.02):
+    if kind == "ema":
+        return Ema(alpha)
+    if kind == "kalman":
+        return Kalman1D(q, r)
+    raise ValueError(f"Unknown steering filter: {kind} (expected ema or kalman)")
+
+
+class SteeringController:
+    """Turns Hough segments into "a"/"d"/"w" without flipping on per-frame noise.
+
+    The length-weighted mean angle and the lateral offset of the segments
+    (midpoint x relative to the center, -1..1) are filtered over time. A
+    turn starts when the filtered signal passes `angle_threshold` and ends
+    only when it falls back below `release` of it (hysteresis). A new
+    command is held at least `min_dwell` seconds. `offset_gain` adds the
+    lateral offset to the angle (0: angle only, as before). `steering` is
+    the proportional value in -1..1 (full scale at `full_scale` rad; positive
+    steers left) for overlays and logs.
+    """
+
+    def __init__(self, angle_threshold=ANGLE_THRESHOLD, release=0.5, min_dwell=0.3, filter="ema",
+                 alpha=0.3, q=0.002, r=0.02, offset_gain=0.0, full_scale=0.5):
+        self.enter = angle_threshold
+        self.exit = angle_threshold * release
+        self.min_dwell = min_dwell
+        self.offset_gain = offset_gain
+        self.full_scale = full_scale
+        self.angle = make_filter(filter, alpha, q, r)
+        self.offset = make_filter(filter, alpha, q, r)
+
+        self.command = None
+        self.steering = 0.0
+        self._since = 0.0
+
+        self.frames = 0
+        self.changes = 0
+
+    def reset(self):
+        self.angle.reset()
+        self.offset.reset()
+        self.command = None
+        self.steering = 0.0
+
+    def _wanted(self, signal):
+        if signal > self.enter or (self.command == "a" and signal > self.exit):
+            return "a"
+        if signal < -self.enter or (self.command == "d" and signal < -self.exit):
+            return "d"
+        return "w"
+
+    def update(self, lines, width, now=None):
+        """Command for the segments of one frame, or None (and a fresh start) when there are none."""
+        self.frames += 1
+        stats, _, _ = lane_stats(lines, width)
+        if stats.angle is None:
+            self.reset()
+            return None
+        now = time.monotonic() if now is None else now
+
+        angle = self.angle.update(stats.angle)
+        offset = self.offset.update((stats.x - width / 2) / (width / 2))
+        signal = angle - self.offset_gain * offset
+        self.steering = max(-1.0, min(1.0, signal / self.full_scale))
+
+        wanted = self._wanted(signal)
+        if wanted != self.command and (self.command is None or now - self._since >= self.min_dwell):
+            if self.command is not None:
+                self.changes += 1
+            self.command = wanted
+            self._since = now
+        return self.command
+
+    def stats(self):
+        rate = self.changes / self.frames * 100 if self.frames else 0.0
+        return f"Steering: {self.changes} command changes in {self.frames} frames ({rate:.1f} per 100 frames)"
@@ -20,6 +20,22 @@ AsyncWebSocket ws("/ws");
 char buffer[64];
 int bufferIndex = 0;
 
+// ======= Binary protocol v1 (common/protocol.py) =======
+// magic, version, opcode, seq (2), value (2), timestamp (4), XOR checksum; little-endian
+#define PROTO_MAGIC     0xA5
+#define PROTO_VERSION   1
+#define PROTO_FRAME_LEN 12
+#define OP_HALT         0x05
+#define OP_PAN          0x10
+#define OP_TILT         0x11
+#define OP_PAN_TILT     0x12
+#define OP_STREAM_START 0x20
+#define OP_STREAM_STOP  0x21
+#define OP_ACK          0x80
+#define OP_NACK         0x81
+uint8_t arduinoFrame[PROTO_FRAME_LEN];
+int arduinoFrameIndex = -1;  // >= 0 while a binary frame from the Arduino is being read
+
 // ======= Camera Config (AI Thinker) =======
 #define PWDN_GPIO_NUM     32
 #define RESET_GPIO_NUM    -1
@@ -56,6 +72,48 @@ void sendToArduino(const String& msg) {
   sendLog("Sent to Arduino -> " + msg);
 }
 
+// ======= Binary Commands =======
+uint8_t protoChecksum(const uint8_t* frame) {
+  uint8_t sum = 0;
+  for (int i = 0; i < PROTO_FRAME_LEN - 1; i++) sum ^= frame[i];
+  return sum;
+}
+
+// ACK/NACK echoes the sequence number and timestamp of the command
+void sendReply(const uint8_t* frame, uint8_t opcode) {
+  uint8_t reply[PROTO_FRAME_LEN];
+  memcpy(reply, frame, PROTO_FRAME_LEN);
+  reply[2] = opcode;
+  reply[5] = frame[2];
+  reply[6] = 0;
+  reply[PROTO_FRAME_LEN - 1] = protoChecksum(reply);
+  ws.binaryAll(reply, PROTO_FRAME_LEN);
+}
+
+void onBinaryCommand(const uint8_t* frame, size_t len) {
+  if (len != PROTO_FRAME_LEN || frame[0] != PROTO_MAGIC || frame[1] != PROTO_VERSION ||
+      frame[PROTO_FRAME_LEN - 1] != protoChecksum(frame)) {
+    sendLog("Invalid binary frame");
+    return;
+  }
+  uint8_t opcode = frame[2];
+  uint16_t value = frame[5] | (frame[6] << 8);
+
+  if (opcode == OP_STREAM_START || opcode == OP_STREAM_STOP) {
+    streamActive = opcode == OP_STREAM_START;
+    sendLog(streamActive ? "Streaming enabled" : "Streaming disabled");
+    sendReply(frame, OP_ACK);
+  } else if ((opcode >= 0x01 && opcode <= OP_HALT) ||
+             ((opcode == OP_PAN || opcode == OP_TILT) && value <= 180) ||
+             (opcode == OP_PAN_TILT && (value & 0xFF) <= 180 && (value >> 8) <= 180)) {
+    // The Arduino applies it and sends the ACK back
+    Serial1.write(frame, PROTO_FRAME_LEN);
+    Serial1.flush();
+  } else {
+    sendReply(frame, OP_NACK);
+  }
+}
+
 // ======= WebSocket Callback =======
 void onWebSocketMessage(AsyncWebSocket *server, AsyncWebSocketClient *client,
                         AwsFrameInfo *info, String data) {
@@ -85,6 +143,16 @@ void onWebSocketMessage(AsyncWebSocket *server, AsyncWebSocketClient *client,
         sendLog("Invalid servo angle: " + valuePart);
       }
     }
+  } else if (data.startsWith("pt:")) {
+    // Both servos in one message: pt:PAN,TILT
+    int commaPos = data.indexOf(',');
+    int pan = data.substring(3, commaPos).toInt();
+    int tilt = data.substring(commaPos + 1).toInt();
+    if (commaPos != -1 && pan >= 0 && pan <= 180 && tilt >= 0 && tilt <= 180) {
+      sendToArduino(data);
+    } else {
+      sendLog("Invalid servo angles: " + data);
+    }
   } else {
     sendLog("Unknown command: " + data);
   }
@@ -98,6 +166,8 @@ void onWsEvent(AsyncWebSocket *server, AsyncWebSocketClient *client,
       String msg;
       for (size_t i = 0; i < len; i++) msg += (char)data[i];
       onWebSocketMessage(server, client, info, msg);
+    } else if (info->final && info->index == 0 && info->len == len && info->opcode == WS_BINARY) {
+      onBinaryCommand(data, len);
     }
   }
 }
@@ -220,7 +290,17 @@ void loop() {
 
   while (Serial1.available()) {
     char inChar = Serial1.read();
-    if (inChar == '\n') {
+    if (arduinoFrameIndex >= 0) {
+      // ACK frame from the Arduino: relay it to the WebSocket clients as is
+      arduinoFrame[arduinoFrameIndex++] = (uint8_t)inChar;
+      if (arduinoFrameIndex == PROTO_FRAME_LEN) {
+        ws.binaryAll(arduinoFrame, PROTO_FRAME_LEN);
+        arduinoFrameIndex = -1;
+      }
+    } else if (bufferIndex == 0 && (uint8_t)inChar == PROTO_MAGIC) {
+      arduinoFrame[0] = PROTO_MAGIC;
+      arduinoFrameIndex = 1;
+    } else if (inChar == '\n') {
       buffer[bufferIndex] = '\0';
       sendLog("Received from Arduino -> " + String(buffer));
       bufferIndex = 0;
@@ -1,15 +1,29 @@
+import os
 import sys
 import asyncio
-import aiohttp
-import websockets
 import cv2
-import numpy as np
-from PyQt5 import uic, QtGui, QtCore
+from PyQt5 import uic, QtCore
 from PyQt5.QtWidgets import QApplication, QWidget, QSpinBox
 from qasync import QEventLoop, asyncSlot
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.connection import ConnectionManager  # noqa: E402
+from common.frame_source import MjpegHttpSource, open_source  # noqa: E402
+from common.frame_worker import FrameWorker  # noqa: E402
+from common.latency import LatencyTracker  # noqa: E402
+from common.renderer import FrameRenderer  # noqa: E402
+from common.servo_scheduler import ServoScheduler  # noqa: E402
+
 ESP32_WS_URL = "ws://192.168.31.81:81/ws"       # ЗАМІНІТЬ НА СВІЙ
 ESP32_VIDEO_URL = "http://192.168.31.81/video"  # ЗАМІНІТЬ НА СВІЙ
+VIDEO_SOURCE = ESP32_VIDEO_URL  # or a video file, a folder of JPEGs, "synthetic"
+
+LATENCY_OVERLAY = False  # draw per-stage latency percentiles on the video
+LATENCY_EXPORT = None    # e.g. "latency.csv" or "latency.jsonl"
+BINARY_PROTOCOL = False  # binary frames with acks (common/protocol.py), needs the updated firmware
+
+SERVO_RATE = 20          # servo messages per second, spinbox ticks in between are coalesced
+SERVO_COMBINE = False    # one "pt:PAN,TILT" message for both axes (needs the updated firmware)
 
 KEY_COMMANDS = {
     QtCore.Qt.Key_W: 'w',
@@ -47,117 +61,100 @@ class VideoControl(QWidget):
         self.start_stream_button.clicked.connect(lambda: self.toggle_video(True))
         self.stop_stream_button.clicked.connect(lambda: self.toggle_video(False))
 
-        self.ws = None
+        self.connection = ConnectionManager(
+            ESP32_WS_URL, on_message=lambda msg: self.append_log(f"ESP32: {msg}"), log=self.append_log,
+            binary=BINARY_PROTOCOL)
         self.video_task = None
         self.stream_active = False
-        self.latest_frame = None
+        self.video_source = open_source(VIDEO_SOURCE)
+        self.latency = LatencyTracker(export_path=LATENCY_EXPORT, end_stage="paint")
+        self.renderer = FrameRenderer(self.video_label, on_done=self.latency.record)
+        self.frame_worker = FrameWorker(self.decode_frame, on_error=lambda e: self.append_log(f"Frame error: {e}"))
+        self.servo_scheduler = ServoScheduler(self.send_servo_command, rate=SERVO_RATE, combine=SERVO_COMBINE)
 
         self.pressed_keys = set()
-        asyncio.ensure_future(self.connect_ws_loop())
+        self.connection.start()
 
         self.setFocusPolicy(QtCore.Qt.StrongFocus)
 
     def append_log(self, msg):
         self.log_view.appendPlainText(f"[{QtCore.QTime.currentTime().toString()}] {msg}")
 
-    async def connect_ws_loop(self):
-        while True:
-            if self.ws is None or self.ws.closed:
-                try:
-                    self.ws = await websockets.connect(ESP32_WS_URL)
-                    self.append_log("Connected to WebSocket")
-                    asyncio.ensure_future(self.receive_ws())
-                except Exception as e:
-                    self.append_log(f" WebSocket error: {e}")
-            await asyncio.sleep(0.5)
-
-    async def receive_ws(self):
-        try:
-            async for message in self.ws:
-                self.append_log(f"ESP32: {message}")
-        except Exception as e:
-            self.append_log(f"WebSocket lost: {e}")
-            self.ws = None
-
     @asyncSlot()
     async def toggle_video(self, enable):
-        if not self.ws or self.ws.closed:
+        # Offline sources (file, folder, synthetic) do not need the ESP32
+        live = isinstance(self.video_source, MjpegHttpSource)
+        if live and not self.connection.connected:
             self.append_log("WebSocket not connected ")
             return
-        try:
-            await self.ws.send("start" if enable else "stop")
-            self.stream_active = enable
-            if enable:
-                if self.video_task:
-                    self.video_task.cancel()
-                self.video_task = asyncio.ensure_future(self.video_stream_task())
-            else:
-                if self.video_task:
-                    self.video_task.cancel()
-                self.video_label.clear()
-                self.latest_frame = None
-        except Exception as e:
-            self.append_log(f"WebSocket error: {e}")
+        if live and not await self.connection.send("start" if enable else "stop"):
+            self.append_log("Stream command not sent")
+            return
+        self.stream_active = enable
+        if enable:
+            if self.video_task:
+                self.video_task.cancel()
+            self.video_task = asyncio.ensure_future(self.video_stream_task())
+        else:
+            if self.video_task:
+                self.video_task.cancel()
+            self.renderer.clear()
 
     async def video_stream_task(self):
+        consumer = asyncio.ensure_future(self.frame_consumer_task())
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(ESP32_VIDEO_URL) as resp:
-                    if resp.status != 200:
-                        self.append_log(f"HTTP error: {resp.status}")
-                        return
-
-                    buffer = b""
-                    while self.stream_active:
-                        chunk = await resp.content.read(4096)
-                        if not chunk:
-                            break
-                        buffer += chunk
-
-                        start = buffer.find(b'\xff\xd8')
-                        end = buffer.find(b'\xff\xd9', start)
-                        if start != -1 and end != -1:
-                            jpeg = buffer[start:end + 2]
-                            buffer = buffer[end + 2:]
-
-                            img_np = np.frombuffer(jpeg, np.uint8)
-                            frame = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
-                            if frame is not None:
-                                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                                self.latest_frame = QtGui.QImage(
-                                    frame.data,
-                                    frame.shape[1],
-                                    frame.shape[0],
-                                    frame.strides[0],
-                                    QtGui.QImage.Format_RGB888
-                                )
-                                self.update_frame()
+            async for frame in self.connection.stream(self.video_source):
+                if not self.stream_active:
+                    break
+                # The worker always takes the newest frame, older ones are stale
+                self.frame_worker.submit(frame)
         except Exception as e:
             self.append_log(f"Video error: {e}")
         finally:
+            consumer.cancel()
+            self.frame_worker.reset()
+            self.append_log(self.frame_worker.stats())
+            self.append_log(self.renderer.stats())
+            self.append_log(self.connection.stats())
+            self.append_log(self.servo_scheduler.stats())
+            if self.latency.recorded:
+                self.append_log(self.latency.summary())
             self.stream_active = False
+            self.renderer.clear()
             self.video_label.setText("Stream stopped")
 
-    def update_frame(self):
-        if self.latest_frame and not self.latest_frame.isNull():
-            pix = QtGui.QPixmap.fromImage(self.latest_frame).scaled(
-                self.video_label.size(),
-                QtCore.Qt.KeepAspectRatio,
-                QtCore.Qt.SmoothTransformation
-            )
-            self.video_label.setPixmap(pix)
+    async def frame_consumer_task(self):
+        try:
+            async for frame, image in self.frame_worker.results():
+                self.renderer.set_frame(image, frame)
+        except Exception as e:
+            self.append_log(f"Frame worker error: {e}")
+            # Nothing is drawn or steered any more, so end the stream instead of feeding a dead consumer
+            self.stream_active = False
+
+    def decode_frame(self, frame):
+        # Runs in the frame worker thread
+        image = frame.decode()
+        if image is None:
+            return None
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        frame.mark("decode")
+        if LATENCY_OVERLAY:
+            self.latency.draw_overlay(image)
+        return image
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self.latest_frame is not None:
-            QtCore.QTimer.singleShot(30, self.update_frame)
+        self.renderer.resize()
 
     def closeEvent(self, event):
         self.stream_active = False
         if self.video_task:
             self.video_task.cancel()
-        if self.ws:
-            asyncio.ensure_future(self.ws.close())
+        self.servo_scheduler.close()
+        asyncio.ensure_future(self.connection.close())
+        self.frame_worker.shutdown()
+        self.latency.close()
         event.accept()
 
     def keyPressEvent(self, event):
@@ -178,35 +175,27 @@ class VideoControl(QWidget):
                 asyncio.ensure_future(self.send_drive_command("halt"))
 
     async def send_drive_command(self, key):
-        if not self.ws or self.ws.closed:
-            return
-        try:
-            await self.ws.send(key)
-            self.append_log(f"Command sent: {key}")
-        except Exception as e:
-            self.append_log(f"Send error: {e}")
+        """True once `key` is written to the WebSocket."""
+        if not await self.connection.send(key):
+            return False
+        self.append_log(f"Command sent: {key}")
+        return True
 
     async def send_servo_command(self, command):
-        if not self.ws or self.ws.closed:
+        """True once `command` is written to the WebSocket."""
+        if not self.connection.connected:
             self.append_log("WebSocket not connected")
-            return
-        try:
-            await self.ws.send(command)
-            self.append_log(f"Command sent: {command}")
-        except Exception as e:
-            self.append_log(f"Send error: {e}")
+            return False
+        if not await self.connection.send(command):
+            return False
+        self.append_log(f"Command sent: {command}")
+        return True
 
     def on_pan_changed_sync(self, value):
-        asyncio.ensure_future(self.on_pan_changed(value))
+        self.servo_scheduler.set("pan", value)
 
     def on_tilt_changed_sync(self, value):
-        asyncio.ensure_future(self.on_tilt_changed(value))
-
-    async def on_pan_changed(self, value):
-        await self.send_servo_command(f"pan:{value}")
-
-    async def on_tilt_changed(self, value):
-        await self.send_servo_command(f"tilt:{180 - value}")
+        self.servo_scheduler.set("tilt", 180 - value)
 
 
 def main():
@@ -21,6 +21,16 @@ Servo tiltServo;
 char buffer[30];
 int bufferIndex = 0;
 
+// Binary protocol v1 (common/protocol.py): magic, version, opcode, seq (2),
+// value (2), timestamp (4), XOR checksum; little-endian
+#define PROTO_MAGIC     0xA5
+#define PROTO_VERSION   1
+#define PROTO_FRAME_LEN 12
+#define OP_ACK          0x80
+#define OP_NACK         0x81
+uint8_t frame[PROTO_FRAME_LEN];
+int frameIndex = -1;  // >= 0 while a binary frame is being read
+
 void setup() {
   Serial.begin(9600);
 
@@ -44,7 +54,17 @@ void setup() {
 void loop() {
   if (Serial.available()) {
     char inChar = Serial.read();
-    if (inChar == '\n') {
+    if (frameIndex >= 0) {
+      frame[frameIndex++] = (uint8_t)inChar;
+      if (frameIndex == PROTO_FRAME_LEN) {
+        handleFrame();
+        frameIndex = -1;
+      }
+    } else if (bufferIndex == 0 && (uint8_t)inChar == PROTO_MAGIC) {
+      // Text commands never contain the magic byte
+      frame[0] = PROTO_MAGIC;
+      frameIndex = 1;
+    } else if (inChar == '\n') {
       buffer[bufferIndex] = '\0';
 
       // Remove trailing \r if present
@@ -64,6 +84,43 @@ void loop() {
   }
 }
 
+uint8_t protoChecksum() {
+  uint8_t sum = 0;
+  for (int i = 0; i < PROTO_FRAME_LEN - 1; i++) sum ^= frame[i];
+  return sum;
+}
+
+// Applies a binary command through the text handler, then acks it:
+// same frame with the ACK opcode, the command opcode as value, seq and timestamp kept
+void handleFrame() {
+  if (frame[1] != PROTO_VERSION || frame[PROTO_FRAME_LEN - 1] != protoChecksum()) {
+    return;  // the ESP32 side times out and counts it as lost
+  }
+  uint8_t opcode = frame[2];
+  uint16_t value = frame[5] | (frame[6] << 8);
+  char cmd[16] = "";
+  switch (opcode) {
+    case 0x01: strcpy(cmd, "w"); break;
+    case 0x02: strcpy(cmd, "s"); break;
+    case 0x03: strcpy(cmd, "a"); break;
+    case 0x04: strcpy(cmd, "d"); break;
+    case 0x05: strcpy(cmd, "halt"); break;
+    case 0x10: snprintf(cmd, sizeof(cmd), "pan:%u", value); break;
+    case 0x11: snprintf(cmd, sizeof(cmd), "tilt:%u", value); break;
+    case 0x12: snprintf(cmd, sizeof(cmd), "pt:%u,%u", value & 0xFF, value >> 8); break;
+  }
+  if (cmd[0] != '\0') {
+    handleCommand(cmd);
+  }
+
+  frame[2] = cmd[0] != '\0' ? OP_ACK : OP_NACK;
+  frame[5] = opcode;
+  frame[6] = 0;
+  frame[PROTO_FRAME_LEN - 1] = protoChecksum();
+  Serial.write(frame, PROTO_FRAME_LEN);
+  Serial.flush();
+}
+
 void handleCommand(const char* cmd) {
   if (strcmp(cmd, "w") == 0) {
     // Forward
@@ -104,5 +161,15 @@ void handleCommand(const char* cmd) {
     int val = atoi(cmd + 5);
     tiltAngle = constrain(val, 0, 180);
     tiltServo.write(tiltAngle);
+
+  } else if (strncmp(cmd, "pt:", 3) == 0) {
+    // Both angles in one line: pt:PAN,TILT
+    const char* comma = strchr(cmd + 3, ',');
+    if (comma != NULL) {
+      panAngle = constrain(atoi(cmd + 3), 0, 180);
+      tiltAngle = constrain(atoi(comma + 1), 0, 180);
+      panServo.write(panAngle);
+      tiltServo.write(tiltAngle);
+    }
   }
 }
@@ -1,16 +1,40 @@
+import os
 import sys
 import asyncio
-import aiohttp
-import websockets
 import cv2
-import numpy as np
-from PyQt5 import uic, QtGui, QtCore
+from PyQt5 import uic, QtCore
 from PyQt5.QtWidgets import QApplication, QWidget, QSpinBox
 from qasync import QEventLoop, asyncSlot
-from ultralytics import YOLO
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.connection import ConnectionManager  # noqa: E402
+from common.frame_source import MjpegHttpSource, open_source  # noqa: E402
+from common.frame_worker import FrameWorker  # noqa: E402
+from common.latency import LatencyTracker  # noqa: E402
+from common.renderer import FrameRenderer  # noqa: E402
+from common.servo_scheduler import ServoScheduler  # noqa: E402
+from detectors import AdaptiveImgszDetector, MotionGatedDetector, load_detector, make_detector  # noqa: E402
+from tracking import draw_detections  # noqa: E402
+from yolo_process import YoloProcess  # noqa: E402
 
 ESP32_WS_URL = "ws://192.168.31.81:81/ws"       # ЗАМІНІТЬ НА СВІЙ
 ESP32_VIDEO_URL = "http://192.168.31.81/video"  # ЗАМІНІТЬ НА СВІЙ
+VIDEO_SOURCE = ESP32_VIDEO_URL  # or a video file, a folder of JPEGs, "synthetic"
+
+LATENCY_OVERLAY = False  # draw per-stage latency percentiles on the video
+LATENCY_EXPORT = None    # e.g. "latency.csv" or "latency.jsonl"
+BINARY_PROTOCOL = False  # binary frames with acks (common/protocol.py), needs the updated firmware
+
+SERVO_RATE = 20          # servo messages per second, spinbox ticks in between are coalesced
+SERVO_COMBINE = False    # one "pt:PAN,TILT" message for both axes (needs the updated firmware)
+
+YOLO_IN_PROCESS = False  # True: run YOLO in a separate process (shared memory handoff)
+YOLO_BACKEND = "torch"   # "onnx" / "openvino": exported once next to yolov8n.pt, faster on CPU
+YOLO_IMGSZ = 320
+ADAPTIVE_IMGSZ = False   # True: step the input size between 192/256/320/416 to stay within the budget
+INFERENCE_BUDGET_MS = 50
+MOTION_THRESHOLD = 0     # % of changed pixels below which YOLO is skipped, e.g. 0.5 (0 disables the gate)
+MOTION_REFRESH = 30      # frames after which YOLO runs even on a static scene
 
 KEY_COMMANDS = {
     QtCore.Qt.Key_W: 'w',
@@ -25,8 +49,12 @@ class VideoControl(QWidget):
         super().__init__()
         uic.loadUi("pan-tilt_detection.ui", self)
 
-        # Load YOLOv8 nano model
-        self.yolo_model = YOLO("yolov8n.pt")
+        # The model is loaded in the background, video and teleop work meanwhile
+        self.detector = None
+        self.vision = None
+        self.motion_gate = None
+        self.adaptive = None
+        self.logged_imgsz_changes = 0
 
         # Video + log
         self.start_stream_button = self.findChild(QWidget, "start_stream_button")
@@ -52,138 +80,166 @@ class VideoControl(QWidget):
         self.stop_stream_button.clicked.connect(lambda: self.toggle_video(False))
 
         # States
-        self.ws = None
+        self.connection = ConnectionManager(
+            ESP32_WS_URL, on_message=lambda msg: self.append_log(f"ESP32: {msg}"), log=self.append_log,
+            binary=BINARY_PROTOCOL)
         self.video_task = None
         self.stream_active = False
-        self.latest_frame = None
+        self.video_source = open_source(VIDEO_SOURCE)
+        self.latency = LatencyTracker(export_path=LATENCY_EXPORT, end_stage="paint")
+        self.renderer = FrameRenderer(self.video_label, on_done=self.latency.record)
+        self.frame_worker = FrameWorker(self.decode_frame, on_error=lambda e: self.append_log(f"Frame error: {e}"))
+        self.servo_scheduler = ServoScheduler(self.send_servo_command, rate=SERVO_RATE, combine=SERVO_COMBINE)
         self.pressed_keys = set()
 
-        asyncio.ensure_future(self.connect_ws_loop())
+        self.connection.start()
+        self.base_title = self.windowTitle()
+        asyncio.ensure_future(self.load_model())
         self.setFocusPolicy(QtCore.Qt.StrongFocus)
 
     # -------------------------- Utility --------------------------
     def append_log(self, msg):
         self.log_view.appendPlainText(f"[{QtCore.QTime.currentTime().toString()}] {msg}")
 
-    # -------------------------- WebSocket --------------------------
-    async def connect_ws_loop(self):
-        while True:
-            if self.ws is None or self.ws.closed:
-                try:
-                    self.ws = await websockets.connect(ESP32_WS_URL)
-                    self.append_log("Connected to WebSocket")
-                    asyncio.ensure_future(self.receive_ws())
-                except Exception as e:
-                    self.append_log(f"WebSocket error: {e}")
-            await asyncio.sleep(0.5)
-
-    async def receive_ws(self):
-        try:
-            async for message in self.ws:
-                self.append_log(f"ESP32: {message}")
-        except Exception as e:
-            self.append_log(f"WebSocket lost: {e}")
-            self.ws = None
-
     # -------------------------- Stream control --------------------------
     @asyncSlot()
     async def toggle_video(self, enable):
-        if not self.ws or self.ws.closed:
+        # Offline sources (file, folder, synthetic) do not need the ESP32
+        live = isinstance(self.video_source, MjpegHttpSource)
+        if live and not self.connection.connected:
             self.append_log("WebSocket not connected")
             return
-        try:
-            await self.ws.send("start" if enable else "stop")
-            self.stream_active = enable
-            if enable:
-                if self.video_task:
-                    self.video_task.cancel()
-                self.video_task = asyncio.ensure_future(self.video_stream_task())
-            else:
-                if self.video_task:
-                    self.video_task.cancel()
-                self.video_label.clear()
-                self.latest_frame = None
-        except Exception as e:
-            self.append_log(f"WebSocket error: {e}")
+        if live and not await self.connection.send("start" if enable else "stop"):
+            self.append_log("Stream command not sent")
+            return
+        self.stream_active = enable
+        if enable:
+            if self.video_task:
+                self.video_task.cancel()
+            self.video_task = asyncio.ensure_future(self.video_stream_task())
+        else:
+            if self.video_task:
+                self.video_task.cancel()
+            self.renderer.clear()
 
     async def video_stream_task(self):
+        consumer = asyncio.ensure_future(self.frame_consumer_task())
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(ESP32_VIDEO_URL) as resp:
-                    if resp.status != 200:
-                        self.append_log(f"HTTP error: {resp.status}")
-                        return
-
-                    buffer = b""
-                    while self.stream_active:
-                        chunk = await resp.content.read(4096)
-                        if not chunk:
-                            break
-                        buffer += chunk
-
-                        start = buffer.find(b'\xff\xd8')
-                        end = buffer.find(b'\xff\xd9', start)
-                        if start != -1 and end != -1:
-                            jpeg = buffer[start:end + 2]
-                            buffer = buffer[end + 2:]
-
-                            img_np = np.frombuffer(jpeg, np.uint8)
-                            frame = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
-                            if frame is not None:
-                                # YOLO detection
-                                frame = self.process_yolo(frame)
-                                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                                self.latest_frame = QtGui.QImage(
-                                    frame.data,
-                                    frame.shape[1],
-                                    frame.shape[0],
-                                    frame.strides[0],
-                                    QtGui.QImage.Format_RGB888
-                                )
-                                self.update_frame()
+            async for frame in self.connection.stream(self.video_source):
+                if not self.stream_active:
+                    break
+                # The worker always takes the newest frame, older ones are stale
+                self.frame_worker.submit(frame)
         except Exception as e:
             self.append_log(f"Video error: {e}")
         finally:
+            consumer.cancel()
+            self.frame_worker.reset()
+            self.append_log(self.frame_worker.stats())
+            self.append_log(self.renderer.stats())
+            self.append_log(self.connection.stats())
+            self.append_log(self.servo_scheduler.stats())
+            if self.latency.recorded:
+                self.append_log(self.latency.summary())
+            if YOLO_IN_PROCESS and self.detector:
+                self.append_log(self.detector.stats())
+            if self.adaptive:
+                self.append_log(self.adaptive.stats())
+            if self.motion_gate:
+                self.append_log(self.motion_gate.stats())
             self.stream_active = False
+            self.renderer.clear()
             self.video_label.setText("Stream stopped")
 
+    async def frame_consumer_task(self):
+        try:
+            async for frame, image in self.frame_worker.results():
+                self.renderer.set_frame(image, frame)
+                if self.adaptive and self.adaptive.changes != self.logged_imgsz_changes:
+                    self.logged_imgsz_changes = self.adaptive.changes
+                    self.append_log(self.adaptive.last_change)
+        except Exception as e:
+            self.append_log(f"Frame worker error: {e}")
+            # Nothing is drawn or steered any more, so end the stream instead of feeding a dead consumer
+            self.stream_active = False
+
+    def decode_frame(self, frame):
+        # Runs in the frame worker thread
+        image = frame.decode()
+        if image is None:
+            return None
+        frame.mark("decode")
+        image = self.process_yolo(image)
+        frame.mark("vision")
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        if LATENCY_OVERLAY:
+            self.latency.draw_overlay(image)
+        return image
+
+    # -------------------------- YOLO model --------------------------
+    def create_detector(self):
+        # Exported models need dynamic input shapes to change the size at runtime
+        if YOLO_IN_PROCESS:
+            return YoloProcess("yolov8n.pt", imgsz=YOLO_IMGSZ, conf=0.5,
+                               backend=YOLO_BACKEND, dynamic=ADAPTIVE_IMGSZ)
+        return make_detector(YOLO_BACKEND, "yolov8n.pt", imgsz=YOLO_IMGSZ, conf=0.5, dynamic=ADAPTIVE_IMGSZ)
+
+    def set_model_state(self, state):
+        self.setWindowTitle(f"{self.base_title} [model {state}]")
+
+    async def load_model(self):
+        self.set_model_state("loading")
+        self.append_log("Loading YOLO model...")
+        loop = asyncio.get_event_loop()
+        try:
+            # Load + dummy 320x320 passes off the UI thread
+            detector, load_ms, first_ms, warm_ms = await loop.run_in_executor(
+                None, load_detector, self.create_detector)
+        except Exception as e:
+            self.set_model_state("error")
+            self.append_log(f"Model error: {e}")
+            return
+        self.detector = self.vision = detector
+        if ADAPTIVE_IMGSZ:
+            self.adaptive = self.vision = AdaptiveImgszDetector(
+                self.vision, budget_ms=INFERENCE_BUDGET_MS, start=YOLO_IMGSZ)
+        if MOTION_THRESHOLD:
+            self.motion_gate = self.vision = MotionGatedDetector(
+                self.vision, threshold=MOTION_THRESHOLD, refresh_every=MOTION_REFRESH)
+        self.set_model_state("ready")
+        self.append_log(f"Model ready: cold start {load_ms:.0f} ms, "
+                        f"first inference {first_ms:.0f} ms, warm {warm_ms:.0f} ms")
+
     # -------------------------- YOLO detection --------------------------
     def process_yolo(self, frame):
-        results = self.yolo_model(frame, imgsz=320, conf=0.5)
-
-        for r in results:
-            for box in r.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                cls = int(box.cls[0])
-                conf = float(box.conf[0])
-                label = f"{self.yolo_model.names[cls]} {conf:.2f}"
-
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, label, (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        if self.vision is None:
+            cv2.putText(frame, "Loading model...", (5, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+            return frame
+        detections = self.vision.detect(frame)
+        draw_detections(frame, detections, self.detector.names, color=(0, 255, 0))
+        if self.adaptive:
+            cv2.putText(frame, f"imgsz {self.adaptive.imgsz}", (5, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+        if YOLO_IN_PROCESS:
+            cv2.putText(frame, f"handoff {self.detector.last_handoff_ms:.2f} ms", (5, 15),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
         return frame
 
     # -------------------------- Frame update --------------------------
-    def update_frame(self):
-        if self.latest_frame and not self.latest_frame.isNull():
-            pix = QtGui.QPixmap.fromImage(self.latest_frame).scaled(
-                self.video_label.size(),
-                QtCore.Qt.KeepAspectRatio,
-                QtCore.Qt.SmoothTransformation
-            )
-            self.video_label.setPixmap(pix)
-
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self.latest_frame is not None:
-            QtCore.QTimer.singleShot(30, self.update_frame)
+        self.renderer.resize()
 
     def closeEvent(self, event):
         self.stream_active = False
         if self.video_task:
             self.video_task.cancel()
-        if self.ws:
-            asyncio.ensure_future(self.ws.close())
+        self.servo_scheduler.close()
+        asyncio.ensure_future(self.connection.close())
+        self.frame_worker.shutdown()
+        self.latency.close()
+        if self.detector:
+            self.detector.close()
         event.accept()
 
     # -------------------------- Keyboard control --------------------------
@@ -205,36 +261,28 @@ class VideoControl(QWidget):
                 asyncio.ensure_future(self.send_drive_command("halt"))
 
     async def send_drive_command(self, key):
-        if not self.ws or self.ws.closed:
-            return
-        try:
-            await self.ws.send(key)
-            self.append_log(f"Command sent: {key}")
-        except Exception as e:
-            self.append_log(f"Send error: {e}")
+        """True once `key` is written to the WebSocket."""
+        if not await self.connection.send(key):
+            return False
+        self.append_log(f"Command sent: {key}")
+        return True
 
     # -------------------------- Servo control --------------------------
     async def send_servo_command(self, command):
-        if not self.ws or self.ws.closed:
+        """True once `command` is written to the WebSocket."""
+        if not self.connection.connected:
             self.append_log("WebSocket not connected")
-            return
-        try:
-            await self.ws.send(command)
-            self.append_log(f"Command sent: {command}")
-        except Exception as e:
-            self.append_log(f"Send error: {e}")
+            return False
+        if not await self.connection.send(command):
+            return False
+        self.append_log(f"Command sent: {command}")
+        return True
 
     def on_pan_changed_sync(self, value):
-        asyncio.ensure_future(self.on_pan_changed(value))
+        self.servo_scheduler.set("pan", value)
 
     def on_tilt_changed_sync(self, value):
-        asyncio.ensure_future(self.on_tilt_changed(value))
-
-    async def on_pan_changed(self, value):
-        await self.send_servo_command(f"pan:{value}")
-
-    async def on_tilt_changed(self, value):
-        await self.send_servo_command(f"tilt:{180 - value}")
+        self.servo_scheduler.set("tilt", 180 - value)
 
 
 # -------------------------- Main --------------------------
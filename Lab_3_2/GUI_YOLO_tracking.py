@@ -1,16 +1,46 @@
+import os
 import sys
 import asyncio
-import aiohttp
-import websockets
 import cv2
-import numpy as np
-from PyQt5 import uic, QtGui, QtCore
+from PyQt5 import uic, QtCore
 from PyQt5.QtWidgets import QApplication, QWidget
 from qasync import QEventLoop, asyncSlot
-from ultralytics import YOLO
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.connection import ConnectionManager  # noqa: E402
+from common.frame_source import MjpegHttpSource, open_source  # noqa: E402
+from common.frame_worker import FrameWorker  # noqa: E402
+from common.latency import LatencyTracker  # noqa: E402
+from common.renderer import FrameRenderer  # noqa: E402
+from detectors import AdaptiveImgszDetector, MotionGatedDetector, load_detector, make_detector  # noqa: E402
+from object_tracker import MultiObjectTracker, TargetLock, draw_tracks  # noqa: E402
+from pan_tilt_control import PanTiltController  # noqa: E402
+from tracking import HybridDetector, RoiDetector  # noqa: E402
+from yolo_process import YoloProcess  # noqa: E402
 
 ESP32_WS_URL = "ws://192.168.31.81:81/ws"       # ЗАМІНІТЬ НА СВІЙ
 ESP32_VIDEO_URL = "http://192.168.31.81/video"  # ЗАМІНІТЬ НА СВІЙ
+VIDEO_SOURCE = ESP32_VIDEO_URL  # or a video file, a folder of JPEGs, "synthetic"
+
+LATENCY_OVERLAY = False  # draw per-stage latency percentiles on the video
+LATENCY_EXPORT = None    # e.g. "latency.csv" or "latency.jsonl"
+BINARY_PROTOCOL = False  # binary frames with acks (common/protocol.py), needs the updated firmware
+
+YOLO_IN_PROCESS = False  # True: run YOLO in a separate process (shared memory handoff)
+YOLO_BACKEND = "torch"   # "onnx" / "openvino": exported once next to yolov8n.pt, faster on CPU
+YOLO_IMGSZ = 320
+ADAPTIVE_IMGSZ = False   # True: step the input size between 192/256/320/416 to stay within the budget
+INFERENCE_BUDGET_MS = 50
+# 1: YOLO on every frame; N: YOLO every N frames, optical flow follows the target in between;
+# "auto": N from the measured YOLO latency
+DETECT_INTERVAL = 1
+MOTION_THRESHOLD = 0     # % of changed pixels below which YOLO is skipped, e.g. 0.5 (0 disables the gate)
+MOTION_REFRESH = 30      # frames after which YOLO runs even on a static scene
+DETECT_CONF = 0.5  # detector threshold; e.g. 0.1: boxes below TRACK_CONF only keep existing tracks alive (ByteTrack)
+TRACK_CONF = 0.5   # confidence that starts a track or picks a target
+ROI_INFERENCE = False  # True: after lock-on run YOLO on a window around the target, rescan the full frame periodically
+PAN_TILT_GAINS = (120, 20, 8)  # kp, ki, kd; tune offline with pan_tilt_control.py
+PAN_TILT_MAX_RATE = 15         # servo commands per second per axis
 
 KEY_COMMANDS = {
     QtCore.Qt.Key_W: 'w',
@@ -25,8 +55,14 @@ class VideoControl(QWidget):
         super().__init__()
         uic.loadUi("pan-tilt_autocontrol.ui", self)
 
-        # Load YOLOv8 nano model (PyTorch format)
-        self.yolo_model = YOLO("yolov8n.pt")
+        # The model is loaded in the background, video and teleop work meanwhile
+        self.detector = None
+        self.vision = None
+        self.adaptive = None
+        self.logged_imgsz_changes = 0
+        self.motion_gate = None
+        self.roi = None
+        self.hybrid = None
 
         # Video + log
         self.start_stream_button = self.findChild(QWidget, "start_stream_button")
@@ -38,166 +74,206 @@ class VideoControl(QWidget):
         self.start_stream_button.clicked.connect(lambda: self.toggle_video(True))
         self.stop_stream_button.clicked.connect(lambda: self.toggle_video(False))
 
-        self.ws = None
+        self.connection = ConnectionManager(
+            ESP32_WS_URL, on_message=lambda msg: self.append_log(f"ESP32: {msg}"), log=self.append_log,
+            binary=BINARY_PROTOCOL)
         self.video_task = None
         self.stream_active = False
-        self.latest_frame = None
+        self.video_source = open_source(VIDEO_SOURCE)
+        self.latency = LatencyTracker(export_path=LATENCY_EXPORT, end_stage="paint")
+        self.renderer = FrameRenderer(self.video_label, on_done=self.latency.record)
+        self.frame_worker = FrameWorker(self.decode_frame, on_error=lambda e: self.append_log(f"Frame error: {e}"))
         self.pressed_keys = set()
-        self.pan_angle = 90
-        self.tilt_angle = 90
-
-        asyncio.ensure_future(self.connect_ws_loop())
+        kp, ki, kd = PAN_TILT_GAINS
+        self.pan_tilt = PanTiltController(kp=kp, ki=ki, kd=kd, max_rate=PAN_TILT_MAX_RATE)
+        # Stable IDs across frames; pan/tilt follows one ID instead of the largest box of each frame
+        self.mot = MultiObjectTracker(high_conf=TRACK_CONF, low_conf=DETECT_CONF)
+        self.target_lock = TargetLock(target="cell phone")
+
+        self.connection.start()
+        self.base_title = self.windowTitle()
+        asyncio.ensure_future(self.load_model())
         self.setFocusPolicy(QtCore.Qt.StrongFocus)
 
     def append_log(self, msg):
         self.log_view.appendPlainText(f"[{QtCore.QTime.currentTime().toString()}] {msg}")
 
-    async def connect_ws_loop(self):
-        while True:
-            if self.ws is None or self.ws.closed:
-                try:
-                    self.ws = await websockets.connect(ESP32_WS_URL)
-                    self.append_log("Connected to WebSocket")
-                    asyncio.ensure_future(self.receive_ws())
-                except Exception as e:
-                    self.append_log(f"WebSocket error: {e}")
-            await asyncio.sleep(0.5)
-
-    async def receive_ws(self):
-        try:
-            async for message in self.ws:
-                self.append_log(f"ESP32: {message}")
-        except Exception as e:
-            self.append_log(f"WebSocket lost: {e}")
-            self.ws = None
-
     @asyncSlot()
     async def toggle_video(self, enable):
-        if not self.ws or self.ws.closed:
+        # Offline sources (file, folder, synthetic) do not need the ESP32
+        live = isinstance(self.video_source, MjpegHttpSource)
+        if live and not self.connection.connected:
             self.append_log("WebSocket not connected")
             return
-        try:
-            await self.ws.send("start" if enable else "stop")
-            self.stream_active = enable
-            if enable:
-                if self.video_task:
-                    self.video_task.cancel()
-                self.video_task = asyncio.ensure_future(self.video_stream_task())
-            else:
-                if self.video_task:
-                    self.video_task.cancel()
-                self.video_label.clear()
-                self.latest_frame = None
-        except Exception as e:
-            self.append_log(f"WebSocket error: {e}")
+        if live and not await self.connection.send("start" if enable else "stop"):
+            self.append_log("Stream command not sent")
+            return
+        self.stream_active = enable
+        if enable:
+            if self.video_task:
+                self.video_task.cancel()
+            self.video_task = asyncio.ensure_future(self.video_stream_task())
+        else:
+            if self.video_task:
+                self.video_task.cancel()
+            self.renderer.clear()
 
     async def video_stream_task(self):
+        consumer = asyncio.ensure_future(self.frame_consumer_task())
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(ESP32_VIDEO_URL) as resp:
-                    if resp.status != 200:
-                        self.append_log(f"HTTP error: {resp.status}")
-                        return
-
-                    buffer = b""
-                    while self.stream_active:
-                        chunk = await resp.content.read(4096)
-                        if not chunk:
-                            break
-                        buffer += chunk
-
-                        start = buffer.find(b'\xff\xd8')
-                        end = buffer.find(b'\xff\xd9', start)
-                        if start != -1 and end != -1:
-                            jpeg = buffer[start:end + 2]
-                            buffer = buffer[end + 2:]
-
-                            img_np = np.frombuffer(jpeg, np.uint8)
-                            frame = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
-                            if frame is not None:
-                                frame = self.process_yolo(frame)
-                                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                                self.latest_frame = QtGui.QImage(
-                                    frame.data,
-                                    frame.shape[1],
-                                    frame.shape[0],
-                                    frame.strides[0],
-                                    QtGui.QImage.Format_RGB888
-                                )
-                                self.update_frame()
+            async for frame in self.connection.stream(self.video_source):
+                if not self.stream_active:
+                    break
+                # The worker always takes the newest frame, older ones are stale
+                self.frame_worker.submit(frame)
         except Exception as e:
             self.append_log(f"Video error: {e}")
         finally:
+            consumer.cancel()
+            self.frame_worker.reset()
+            self.append_log(self.frame_worker.stats())
+            self.append_log(self.renderer.stats())
+            self.append_log(self.connection.stats())
+            if self.latency.recorded:
+                self.append_log(self.latency.summary())
+            if YOLO_IN_PROCESS and self.detector:
+                self.append_log(self.detector.stats())
+            if self.adaptive:
+                self.append_log(self.adaptive.stats())
+            if self.motion_gate:
+                self.append_log(self.motion_gate.stats())
+            if self.roi:
+                self.append_log(self.roi.stats())
+            if self.hybrid:
+                self.append_log(self.hybrid.stats())
+            self.append_log(self.mot.stats())
+            self.append_log(self.pan_tilt.stats())
             self.stream_active = False
+            self.renderer.clear()
             self.video_label.setText("Stream stopped ")
 
-    def get_color_for_class(self, cls_id):
-        np.random.seed(cls_id)
-        color = np.random.randint(0, 255, size=3).tolist()
-        return tuple(int(c) for c in color)
+    async def frame_consumer_task(self):
+        try:
+            async for frame, (commands, image) in self.frame_worker.results():
+                for command in commands:
+                    await self.send_drive_command(command)
+                if commands:
+                    frame.mark("send")
+
+                self.renderer.set_frame(image, frame)
+                if self.adaptive and self.adaptive.changes != self.logged_imgsz_changes:
+                    self.logged_imgsz_changes = self.adaptive.changes
+                    self.append_log(self.adaptive.last_change)
+        except Exception as e:
+            self.append_log(f"Frame worker error: {e}")
+            # Nothing is drawn or steered any more, so end the stream instead of feeding a dead consumer
+            self.stream_active = False
+
+    def decode_frame(self, frame):
+        # Runs in the frame worker thread
+        image = frame.decode()
+        if image is None:
+            return None
+        frame.mark("decode")
+        image, commands = self.process_yolo(image)
+        frame.mark("vision")
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        if LATENCY_OVERLAY:
+            self.latency.draw_overlay(image)
+        return commands, image
+
+    # -------------------------- YOLO model --------------------------
+    def create_detector(self):
+        # Exported models need dynamic input shapes to change the size at runtime
+        if YOLO_IN_PROCESS:
+            return YoloProcess("yolov8n.pt", imgsz=YOLO_IMGSZ, conf=DETECT_CONF,
+                               backend=YOLO_BACKEND, dynamic=ADAPTIVE_IMGSZ)
+        return make_detector(YOLO_BACKEND, "yolov8n.pt", imgsz=YOLO_IMGSZ, conf=DETECT_CONF, dynamic=ADAPTIVE_IMGSZ)
+
+    def set_model_state(self, state):
+        self.setWindowTitle(f"{self.base_title} [model {state}]")
+
+    async def load_model(self):
+        self.set_model_state("loading")
+        self.append_log("Loading YOLO model...")
+        loop = asyncio.get_event_loop()
+        try:
+            # Load + dummy 320x320 passes off the UI thread
+            detector, load_ms, first_ms, warm_ms = await loop.run_in_executor(
+                None, load_detector, self.create_detector)
+        except Exception as e:
+            self.set_model_state("error")
+            self.append_log(f"Model error: {e}")
+            return
+        self.detector = detector
+        self.vision = self.detector
+        if ADAPTIVE_IMGSZ:
+            self.adaptive = self.vision = AdaptiveImgszDetector(
+                self.vision, budget_ms=INFERENCE_BUDGET_MS, start=YOLO_IMGSZ)
+        if ROI_INFERENCE:
+            self.roi = self.vision = RoiDetector(self.vision, target="cell phone", min_conf=TRACK_CONF)
+        if MOTION_THRESHOLD:
+            self.motion_gate = self.vision = MotionGatedDetector(
+                self.vision, threshold=MOTION_THRESHOLD, refresh_every=MOTION_REFRESH)
+        if DETECT_INTERVAL != 1:
+            self.hybrid = self.vision = HybridDetector(
+                self.vision, target="cell phone", interval=None if DETECT_INTERVAL == "auto" else DETECT_INTERVAL,
+                min_conf=TRACK_CONF)
+        self.set_model_state("ready")
+        self.append_log(f"Model ready: cold start {load_ms:.0f} ms, "
+                        f"first inference {first_ms:.0f} ms, warm {warm_ms:.0f} ms")
 
     def process_yolo(self, frame):
-        results = self.yolo_model(frame, imgsz=320, conf=0.5)
-        frame_h, frame_w = frame.shape[:2]
-
-        max_area = 0
-        target_center = None
-
-        for r in results:
-            for box in r.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                cls = int(box.cls[0])
-                conf = float(box.conf[0])
-                label = f"{self.yolo_model.names[cls]} {conf:.2f}"
-                color = self.get_color_for_class(cls)
-
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(frame, label, (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-                if self.yolo_model.names[cls] == "cell phone":
-                    area = (x2 - x1) * (y2 - y1)
-                    if area > max_area:
-                        max_area = area
-                        target_center = ((x1 + x2) // 2, (y1 + y2) // 2)
-
-        if target_center:
-            cx, cy = target_center
-            offset_x = cx - frame_w // 2
-            offset_y = cy - frame_h // 2
-
-            if abs(offset_x) > 10:
-                self.pan_angle += -1 if offset_x > 0 else 1
-                self.pan_angle = max(0, min(180, self.pan_angle))
-                asyncio.ensure_future(self.send_drive_command(f"pan:{self.pan_angle}"))
-
-            if abs(offset_y) > 10:
-                self.tilt_angle += 1 if offset_y > 0 else -1
-                self.tilt_angle = max(0, min(180, self.tilt_angle))
-                asyncio.ensure_future(self.send_drive_command(f"tilt:{self.tilt_angle}"))
-
-        return frame
-
-    def update_frame(self):
-        if self.latest_frame and not self.latest_frame.isNull():
-            pix = QtGui.QPixmap.fromImage(self.latest_frame).scaled(
-                self.video_label.size(),
-                QtCore.Qt.KeepAspectRatio,
-                QtCore.Qt.SmoothTransformation
-            )
-            self.video_label.setPixmap(pix)
+        if self.vision is None:
+            cv2.putText(frame, "Loading model...", (5, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+            return frame, []
+        detections = self.vision.detect(frame)
+        names = self.detector.names
+        tracks = self.mot.update(detections)
+        target = self.target_lock.update(tracks, names)
+        draw_tracks(frame, tracks, names, locked_id=self.target_lock.locked_id)
+        # ROI window and optical flow follow the locked ID, not the largest box
+        for stage in (self.roi, self.hybrid):
+            if stage:
+                stage.set_target(None if target is None else target.box)
+
+        commands = []
+        # While the locked object is occluded the camera holds still
+        if target is None:
+            self.pan_tilt.reset()
+        elif target.time_since_update == 0:
+            commands = self.pan_tilt.move_towards(target.box, frame.shape)
+
+        if self.roi and self.roi.window and (not self.hybrid or self.hybrid.last_detected):
+            x1, y1, x2, y2 = self.roi.window
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 255, 255), 1)
+        if self.hybrid:
+            mode = "YOLO" if self.hybrid.last_detected else "flow"
+            cv2.putText(frame, f"{mode}, YOLO every {self.hybrid.interval}", (5, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+        if self.adaptive:
+            cv2.putText(frame, f"imgsz {self.adaptive.imgsz}", (5, 45),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+        if YOLO_IN_PROCESS:
+            cv2.putText(frame, f"handoff {self.detector.last_handoff_ms:.2f} ms", (5, 15),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+        # Commands are sent from the event loop, this runs in the frame worker
+        return frame, commands
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self.latest_frame is not None:
-            QtCore.QTimer.singleShot(30, self.update_frame)
+        self.renderer.resize()
 
     def closeEvent(self, event):
         self.stream_active = False
         if self.video_task:
             self.video_task.cancel()
-        if self.ws:
-            asyncio.ensure_future(self.ws.close())
+        asyncio.ensure_future(self.connection.close())
+        self.frame_worker.shutdown()
+        self.latency.close()
+        if self.detector:
+            self.detector.close()
         event.accept()
 
     def keyPressEvent(self, event):
@@ -218,13 +294,11 @@ class VideoControl(QWidget):
                 asyncio.ensure_future(self.send_drive_command("halt"))
 
     async def send_drive_command(self, key):
-        if not self.ws or self.ws.closed:
-            return
-        try:
-            await self.ws.send(key)
-            self.append_log(f"Command sent: {key}")
-        except Exception as e:
-            self.append_log(f" Send error: {e}")
+        """True once `key` is written to the WebSocket."""
+        if not await self.connection.send(key):
+            return False
+        self.append_log(f"Command sent: {key}")
+        return True
 
 
 def main():
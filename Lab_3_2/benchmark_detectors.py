@@ -0,0 +1,108 @@
+import os
+import sys
+import glob
+import time
+import argparse
+
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.frame_source import SyntheticSource  # noqa: E402
+from detectors import BACKENDS, make_detector  # noqa: E402
+
+
+def load_frames(directory):
+    return [cv2.imread(path) for path in sorted(glob.glob(os.path.join(directory, "*.jp*g")))]
+
+
+def synthetic_frames(count, width=320, height=240):
+    source = SyntheticSource(width, height)
+    return [source.render(i) for i in range(count)]
+
+
+def time_detector(name, detector, frames, repeats):
+    detector.detect(frames[0])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for frame in frames:
+            detector.detect(frame)
+    per_frame = (time.perf_counter() - start) * 1000.0 / (repeats * len(frames))
+    print(f"{name:<12} {per_frame:7.2f} ms/frame  {1000.0 / per_frame:7.1f} fps")
+    return per_frame
+
+
+def time_batch(name, detector, frames, size, repeats):
+    batches = [frames[i:i + size] for i in range(0, len(frames) - size + 1, size)]
+    detector.detect_batch(batches[0])  # warm-up
+    results = {}
+    for label, fn in (("single", lambda batch: [detector.detect(f) for f in batch]),
+                      ("batched", detector.detect_batch)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for batch in batches:
+                fn(batch)
+        results[label] = (time.perf_counter() - start) * 1000.0 / (repeats * len(batches) * size)
+    print(f"{name:<12} {size} cameras: single {results['single']:.2f} ms/frame, "
+          f"batched {results['batched']:.2f} ms/frame (x{results['single'] / results['batched']:.2f})")
+
+
+def iou(a, b):
+    w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    return inter / ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter + 1e-9)
+
+
+def same_detections(a, b, min_iou=0.5):
+    """Every box has a box of the same class with IoU >= min_iou on the other side."""
+    if len(a) != len(b):
+        return False
+    return all(any(int(d[5]) == int(e[5]) and iou(d, e) >= min_iou for e in b) for d in a)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 3.2 YOLO: ultralytics (PyTorch) vs exported backends")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--frames", help="directory with recorded JPEG frames (default: synthetic QVGA)")
+    parser.add_argument("--count", type=int, default=50, help="number of synthetic frames")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--conf", type=float, default=0.5)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--batch", type=int, default=0,
+                        help="also compare N single-frame calls with one batch of N (multi-camera)")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else synthetic_frames(args.count)
+    if not frames:
+        sys.exit("No frames to benchmark")
+    print(f"{len(frames)} frames x {args.repeats} repeats, imgsz {args.imgsz}, conf {args.conf}")
+
+    reference = make_detector("torch", args.model, args.imgsz, args.conf)
+    expected = [reference.detect(frame) for frame in frames]
+    baseline = time_detector("torch", reference, frames, args.repeats)
+
+    for backend in args.backends:
+        if backend == "torch":
+            continue
+        try:
+            detector = make_detector(backend, args.model, args.imgsz, args.conf)
+        except ImportError as e:
+            print(f"{backend:<12} skipped: {e}")
+            continue
+        per_frame = time_detector(backend, detector, frames, args.repeats)
+        agree = sum(same_detections(detector.detect(frame), dets) for frame, dets in zip(frames, expected))
+        print(f"{'':<12} speed-up x{baseline / per_frame:.2f}, "
+              f"same detections as torch: {agree}/{len(frames)} frames")
+
+    if args.batch > 1:
+        for backend in args.backends:
+            try:
+                detector = make_detector(backend, args.model, args.imgsz, args.conf, dynamic=True)
+            except ImportError:
+                continue
+            time_batch(backend, detector, frames, args.batch, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
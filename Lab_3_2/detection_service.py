@@ -0,0 +1,94 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from common.frame_worker import LatestFrameSlot
+
+
+class BatchedDetectionService:
+    """One YOLO model for several cameras, fed in batches.
+
+    Each camera has its own latest-frame-wins slot. When a frame arrives the
+    service waits up to `window` seconds for the other cameras, then decodes
+    the newest frame of every camera that has one and runs them through
+    `detector.detect_batch` in a single forward pass. `results()` yields
+    (camera, frame, image, detections) for every frame of the batch.
+    """
+
+    def __init__(self, detector, cameras, window=0.015):
+        self.detector = detector
+        self.window = window
+        self.slots = {camera: LatestFrameSlot() for camera in cameras}
+        self._ready = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-batch")
+
+        self.batches = 0
+        self.frames = 0
+        self.total_infer_ms = 0.0
+
+    @property
+    def dropped(self):
+        return sum(slot.dropped for slot in self.slots.values())
+
+    def submit(self, camera, frame):
+        self.slots[camera].put(frame)
+        self._ready.set()
+
+    def _pending(self):
+        return sum(slot.pending for slot in self.slots.values())
+
+    async def _collect(self):
+        await self._ready.wait()
+        # Give the other cameras a moment to deliver their newest frame
+        deadline = time.perf_counter() + self.window
+        while self._pending() < len(self.slots):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        self._ready.clear()
+        return [(camera, slot.take()) for camera, slot in self.slots.items() if slot.pending]
+
+    def _process(self, batch):
+        # Runs in the batch thread
+        decoded = []
+        for camera, frame in batch:
+            image = frame.decode()
+            if image is not None:
+                frame.mark("decode")
+                decoded.append((camera, frame, image))
+        if not decoded:
+            return []
+        t0 = time.perf_counter()
+        detections = self.detector.detect_batch([image for _, _, image in decoded])
+        self.total_infer_ms += (time.perf_counter() - t0) * 1000.0
+        for _, frame, _ in decoded:
+            frame.mark("vision")
+        return [item + (dets,) for item, dets in zip(decoded, detections)]
+
+    async def results(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            results = await loop.run_in_executor(self.executor, self._process, batch)
+            self.batches += 1
+            self.frames += len(results)
+            for result in results:
+                yield result
+
+    def stats(self):
+        mean_batch = self.frames / self.batches if self.batches else 0.0
+        mean_ms = self.total_infer_ms / self.batches if self.batches else 0.0
+        return (f"batches: {self.batches}, mean batch {mean_batch:.2f} frames, "
+                f"inference {mean_ms:.1f} ms/batch, dropped (busy): {self.dropped}")
+
+    def shutdown(self):
+        for slot in self.slots.values():
+            slot.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,392 @@
+import os
+import ast
+import time
+
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+IOU_THRESHOLD = 0.7  # same as ultralytics predict
+MAX_DETECTIONS = 300
+PAD_VALUE = 114
+MAX_WH = 7680  # box offset per class, NMS then never mixes classes
+
+
+class YoloDetector:
+    """ultralytics YOLO model running in this process.
+
+    Same interface as YoloProcess: `detect(frame)` returns an (N, 6) array of
+    x1, y1, x2, y2, conf, cls and `names` maps class ids to names.
+    `variable_imgsz` tells whether `detect` accepts another input size.
+    """
+
+    variable_imgsz = True
+
+    def __init__(self, model_path, imgsz=320, conf=0.5):
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+        self.imgsz = imgsz
+        self.conf = conf
+
+    def detect(self, frame, imgsz=None):
+        results = self.model(frame, imgsz=imgsz or self.imgsz, conf=self.conf, verbose=False)
+        return results[0].boxes.data.cpu().numpy()
+
+    def detect_batch(self, frames):
+        results = self.model(list(frames), imgsz=self.imgsz, conf=self.conf, verbose=False)
+        return [r.boxes.data.cpu().numpy() for r in results]
+
+    def close(self):
+        pass
+
+
+# -------------------------- Pre/post-processing --------------------------
+def letterbox(image, size):
+    """Resize keeping the aspect ratio and pad to size x size.
+
+    Returns the padded image, the scale and the (left, top) padding.
+    """
+    h, w = image.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = round(w * ratio), round(h * ratio)
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    left = (size - new_w) // 2
+    top = (size - new_h) // 2
+    image = cv2.copyMakeBorder(image, top, size - new_h - top, left, size - new_w - left,
+                               cv2.BORDER_CONSTANT, value=(PAD_VALUE, PAD_VALUE, PAD_VALUE))
+    return image, ratio, (left, top)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression, returns indices of the kept boxes."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.intp)
+
+
+def postprocess(output, conf, ratio, pad, shape, iou_threshold=IOU_THRESHOLD):
+    """Raw YOLOv8 output (1, 4 + classes, anchors) -> (N, 6) array in frame pixels."""
+    pred = output[0].T
+    class_scores = pred[:, 4:]
+    cls = class_scores.argmax(1)
+    scores = class_scores[np.arange(len(pred)), cls]
+    mask = scores > conf
+    pred, scores, cls = pred[mask], scores[mask], cls[mask]
+    if not len(pred):
+        return np.zeros((0, 6), dtype=np.float32)
+
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    keep = nms(boxes + cls[:, None] * MAX_WH, scores, iou_threshold)[:MAX_DETECTIONS]
+
+    boxes = boxes[keep]
+    boxes -= (pad[0], pad[1], pad[0], pad[1])
+    boxes /= ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    return np.column_stack([boxes, scores[keep], cls[keep]]).astype(np.float32)
+
+
+def exported_path(model_path, backend, imgsz, dynamic=False):
+    """Where the export of `model_path` for `backend` is cached (next to the .pt file)."""
+    stem = os.path.splitext(model_path)[0] + ("_dynamic" if dynamic else "")
+    if backend == "onnx":
+        return f"{stem}_{imgsz}.onnx"
+    return f"{stem}_{imgsz}_openvino_model"
+
+
+def export_model(model_path, backend, imgsz, dynamic=False, log=print):
+    """Export once with ultralytics; later runs reuse the cached file.
+
+    `dynamic` exports a variable batch size for `detect_batch`. `log` gets
+    a note before the (slow) export starts.
+    """
+    target = exported_path(model_path, backend, imgsz, dynamic)
+    if not os.path.exists(target):
+        from ultralytics import YOLO
+
+        log(f"Exporting {model_path} to {backend} ({imgsz}x{imgsz}), this runs once")
+        path = YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=dynamic)
+        os.replace(path, target)
+    return target
+
+
+# -------------------------- Exported model backends --------------------------
+class _ExportedDetector:
+    """Letterbox -> runtime inference -> NumPy NMS, no PyTorch at run time."""
+
+    def __init__(self, imgsz, conf, dynamic):
+        self.imgsz = imgsz
+        self.conf = conf
+        self.dynamic = dynamic
+        self.names = {}
+
+    @property
+    def variable_imgsz(self):
+        return self.dynamic
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    def detect(self, frame, imgsz=None):
+        # A static export only takes the size it was exported with
+        size = imgsz if imgsz and self.dynamic else self.imgsz
+        image, ratio, pad = letterbox(frame, size)
+        # BGR HWC uint8 -> RGB NCHW float 0..1 in one pass
+        blob = cv2.dnn.blobFromImage(image, 1 / 255.0, swapRB=True)
+        return postprocess(self._infer(blob), self.conf, ratio, pad, frame.shape)
+
+    def detect_batch(self, frames):
+        """One forward pass for all frames; a model exported without `dynamic` runs them one by one."""
+        if not self.dynamic:
+            return [self.detect(frame) for frame in frames]
+        boxed = [letterbox(frame, self.imgsz) for frame in frames]
+        blob = cv2.dnn.blobFromImages([image for image, _, _ in boxed], 1 / 255.0, swapRB=True)
+        output = self._infer(blob)
+        return [postprocess(output[i:i + 1], self.conf, ratio, pad, frame.shape)
+                for i, (frame, (_, ratio, pad)) in enumerate(zip(frames, boxed))]
+
+    def close(self):
+        pass
+
+
+class OnnxDetector(_ExportedDetector):
+    """yolov8 exported to ONNX, run by ONNX Runtime on the CPU."""
+
+    def __init__(self, model_path, imgsz=320, conf=0.5, dynamic=False, log=print):
+        import onnxruntime as ort
+
+        super().__init__(imgsz, conf, dynamic)
+        path = model_path if model_path.endswith(".onnx") else export_model(model_path, "onnx", imgsz, dynamic, log)
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        if names:
+            self.names = ast.literal_eval(names)
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(_ExportedDetector):
+    """yolov8 exported to OpenVINO IR, compiled for the CPU with a latency hint."""
+
+    def __init__(self, model_path, imgsz=320, conf=0.5, dynamic=False, log=print):
+        import yaml
+        try:
+            from openvino import Core
+        except ImportError:  # openvino 2023.0
+            from openvino.runtime import Core
+
+        super().__init__(imgsz, conf, dynamic)
+        path = model_path if os.path.isdir(model_path) else export_model(model_path, "openvino", imgsz, dynamic, log)
+        xml = next(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".xml"))
+        core = Core()
+        self.model = core.compile_model(core.read_model(xml), "CPU", {"PERFORMANCE_HINT": "LATENCY"})
+        self.output = self.model.output(0)
+        metadata = os.path.join(path, "metadata.yaml")
+        if os.path.exists(metadata):
+            with open(metadata) as f:
+                self.names = yaml.safe_load(f).get("names", {})
+
+    def _infer(self, blob):
+        return self.model([blob])[self.output]
+
+
+def make_detector(backend, model_path, imgsz=320, conf=0.5, dynamic=False, log=print):
+    """Detector for `backend`: torch (ultralytics), onnx or openvino.
+
+    `dynamic` gives exported models a variable batch size (see `detect_batch`)
+    and input size (see `AdaptiveImgszDetector`).
+    """
+    if backend == "onnx":
+        return OnnxDetector(model_path, imgsz, conf, dynamic, log)
+    if backend == "openvino":
+        return OpenVinoDetector(model_path, imgsz, conf, dynamic, log)
+    if backend == "torch":
+        return YoloDetector(model_path, imgsz, conf)
+    raise ValueError(f"Unknown detector backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def load_detector(create, warmup_size=320):
+    """Build a detector with `create()` and warm it up with dummy passes.
+
+    The first pass allocates buffers and picks kernels, so it is much slower
+    than the steady state. Meant to run in a background thread; returns
+    (detector, load_ms, first_ms, warm_ms). Detectors that load in the
+    background (`YoloProcess`) are waited for within `load_ms`.
+    """
+    t0 = time.perf_counter()
+    detector = create()
+    wait_ready = getattr(detector, "wait_ready", None)
+    if wait_ready and not wait_ready():
+        detector.close()
+        raise RuntimeError("YOLO process did not start")
+    load_ms = (time.perf_counter() - t0) * 1000.0
+
+    dummy = np.zeros((warmup_size, warmup_size, 3), dtype=np.uint8)
+    timings = []
+    for _ in range(2):
+        t0 = time.perf_counter()
+        detector.detect(dummy)
+        timings.append((time.perf_counter() - t0) * 1000.0)
+    return detector, load_ms, timings[0], timings[1]
+
+
+class MotionGatedDetector:
+    """Skips `detector` while the scene is static and reuses the last detections.
+
+    Every frame is reduced to a small grayscale thumbnail and compared with
+    the thumbnail of the last frame that went through the model. Motion is
+    the share (%) of thumbnail pixels that changed by more than
+    `pixel_delta` gray levels, so a small moving object counts while sensor
+    and JPEG noise do not; comparing with the last inferred frame lets slow
+    drift add up. Below `threshold` % the last detections are reused. The
+    model runs at least every `refresh_every` frames.
+    """
+
+    def __init__(self, detector, threshold=0.5, refresh_every=30, pixel_delta=12, size=(64, 48)):
+        self.detector = detector
+        self.threshold = threshold
+        self.refresh_every = refresh_every
+        self.pixel_delta = pixel_delta
+        self.size = size
+
+        self._reference = None
+        self._last = None
+        self._since_inference = 0
+        self.motion = 0.0
+        self.last_inferred = False  # whether the last detect call ran the model
+        self.inferred = 0
+        self.skipped = 0
+
+    @property
+    def names(self):
+        return self.detector.names
+
+    def detect(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        if self._reference is not None and self._since_inference < self.refresh_every:
+            changed = cv2.countNonZero(cv2.threshold(
+                cv2.absdiff(thumb, self._reference), self.pixel_delta, 255, cv2.THRESH_BINARY)[1])
+            self.motion = 100.0 * changed / thumb.size
+            if self.motion < self.threshold:
+                self._since_inference += 1
+                self.skipped += 1
+                self.last_inferred = False
+                return self._last
+
+        self._last = self.detector.detect(frame)
+        self._reference = thumb
+        self._since_inference = 0
+        self.inferred += 1
+        self.last_inferred = True
+        return self._last
+
+    def stats(self):
+        total = self.inferred + self.skipped
+        share = 100.0 * self.skipped / total if total else 0.0
+        return (f"Motion gate: YOLO on {self.inferred}/{total} frames, "
+                f"{self.skipped} static frames skipped ({share:.0f}%)")
+
+    def close(self):
+        self.detector.close()
+
+
+IMGSZ_PRESETS = (192, 256, 320, 416)
+
+
+class AdaptiveImgszDetector:
+    """Steps the model input size between `presets` to keep inference within `budget_ms`.
+
+    The smoothed latency of full-frame passes is checked after `patience`
+    frames at a size: over the budget the size steps down; when the latency
+    scaled to the next larger size ((next / size)^2) stays under `headroom`
+    of the budget it steps up. The gap between the two conditions and the
+    wait after each change keep the size from flapping. ROI passes keep
+    their own smaller size and are not measured.
+    """
+
+    variable_imgsz = True
+
+    def __init__(self, detector, budget_ms=50.0, presets=IMGSZ_PRESETS, start=320, patience=10, headroom=0.8):
+        if not getattr(detector, "variable_imgsz", False):
+            raise ValueError("Adaptive input size needs the torch backend or a dynamic export")
+        if patience < 1:
+            # The first pass at each size is not measured, so there is no latency before the second
+            raise ValueError("patience must be at least 1 frame")
+        self.detector = detector
+        self.budget_ms = budget_ms
+        self.presets = tuple(sorted(presets))
+        self.index = min(range(len(self.presets)), key=lambda i: abs(self.presets[i] - start))
+        self.patience = patience
+        self.headroom = headroom
+
+        self.latency_ms = None
+        self._frames_at_size = 0
+        self.changes = 0
+        self.last_change = ""
+
+    @property
+    def names(self):
+        return self.detector.names
+
+    @property
+    def imgsz(self):
+        return self.presets[self.index]
+
+    def detect(self, frame, imgsz=None):
+        if imgsz:
+            return self.detector.detect(frame, imgsz=min(imgsz, self.imgsz))
+        t0 = time.perf_counter()
+        detections = self.detector.detect(frame, imgsz=self.imgsz)
+        ms = (time.perf_counter() - t0) * 1000.0
+
+        # The first pass at a new size may include one-off allocations
+        if self._frames_at_size > 0:
+            self.latency_ms = ms if self.latency_ms is None else self.latency_ms + 0.2 * (ms - self.latency_ms)
+        self._frames_at_size += 1
+        if self._frames_at_size > self.patience:
+            self._adapt()
+        return detections
+
+    def _adapt(self):
+        index = self.index
+        if self.latency_ms > self.budget_ms and index > 0:
+            index -= 1
+        elif index < len(self.presets) - 1:
+            scale = (self.presets[index + 1] / self.imgsz) ** 2
+            if self.latency_ms * scale < self.headroom * self.budget_ms:
+                index += 1
+        if index == self.index:
+            return
+        self.last_change = (f"YOLO input size {self.imgsz} -> {self.presets[index]} "
+                            f"(inference {self.latency_ms:.0f} ms, budget {self.budget_ms:.0f} ms)")
+        self.index = index
+        self.latency_ms = None
+        self._frames_at_size = 0
+        self.changes += 1
+
+    def stats(self):
+        latency = f"{self.latency_ms:.0f} ms" if self.latency_ms is not None else "-"
+        return (f"Adaptive input size: {self.imgsz} (inference {latency}, budget {self.budget_ms:.0f} ms), "
+                f"{self.changes} changes")
+
+    def close(self):
+        self.detector.close()
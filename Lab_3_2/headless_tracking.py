@@ -0,0 +1,125 @@
+"""Pan-tilt YOLO tracking without the GUI (e.g. over SSH on a companion computer).
+
+    python headless_tracking.py --target "cell phone" --source http://192.168.31.81/video
+
+Runs the same stream -> YOLO -> pan/tilt WebSocket command loop as
+GUI_YOLO_tracking.py and prints throughput periodically.
+"""
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.headless import HeadlessRunner, add_common_args, run  # noqa: E402
+from detectors import BACKENDS, AdaptiveImgszDetector, MotionGatedDetector, load_detector, make_detector  # noqa: E402
+from object_tracker import MultiObjectTracker, TargetLock  # noqa: E402
+from pan_tilt_control import PanTiltController  # noqa: E402
+from tracking import DEADBAND, TARGET_CLASS, HybridDetector, RoiDetector  # noqa: E402
+from yolo_process import YoloProcess  # noqa: E402
+
+ESP32_WS_URL = "ws://192.168.31.81:81/ws"       # ЗАМІНІТЬ НА СВІЙ
+ESP32_VIDEO_URL = "http://192.168.31.81/video"  # ЗАМІНІТЬ НА СВІЙ
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_common_args(parser, ESP32_WS_URL, ESP32_VIDEO_URL)
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS,
+                        help="onnx/openvino are exported once next to the model and run without PyTorch")
+    parser.add_argument("--target", default=TARGET_CLASS, help="class name to follow")
+    parser.add_argument("--conf", type=float, default=0.5,
+                        help="detection threshold; below --track-conf (e.g. 0.1) weak boxes keep existing tracks alive")
+    parser.add_argument("--track-conf", type=float, default=0.5, help="confidence that starts a track")
+    parser.add_argument("--imgsz", type=int, default=320, help="YOLO input size (initial one with --budget-ms)")
+    parser.add_argument("--budget-ms", type=float, default=0,
+                        help="step the input size between 192/256/320/416 to keep inference within this budget")
+    parser.add_argument("--deadband", type=int, default=DEADBAND, help="px around the center with no movement")
+    parser.add_argument("--kp", type=float, default=120.0, help="pan/tilt PID gains, see pan_tilt_control.py")
+    parser.add_argument("--ki", type=float, default=20.0)
+    parser.add_argument("--kd", type=float, default=8.0)
+    parser.add_argument("--max-rate", type=float, default=15.0, help="servo commands per second per axis")
+    parser.add_argument("--max-age", type=int, default=30, help="frames a lost track (occlusion) is kept")
+    parser.add_argument("--detect-every", default="1",
+                        help="YOLO every N frames with optical flow in between; 1 = every frame, "
+                             "auto = N from the measured YOLO latency")
+    parser.add_argument("--target-fps", type=float, default=30.0, help="control loop rate for --detect-every auto")
+    parser.add_argument("--roi", action="store_true",
+                        help="after lock-on run YOLO on a window around the target instead of the whole frame")
+    parser.add_argument("--rescan-every", type=int, default=30, help="frames between full-frame scans in ROI mode")
+    parser.add_argument("--motion-threshold", type=float, default=0,
+                        help="%% of changed pixels below which YOLO is skipped, e.g. 0.5; 0 disables the gate")
+    parser.add_argument("--motion-refresh", type=int, default=30,
+                        help="frames after which YOLO runs on a static scene")
+    parser.add_argument("--binary", action="store_true",
+                        help="binary command frames with acks, prints command-to-actuation latency")
+    parser.add_argument("--yolo-process", action="store_true",
+                        help="run YOLO in a separate process (shared memory handoff)")
+    args = parser.parse_args()
+
+    adaptive_imgsz = args.budget_ms > 0
+
+    def create_detector():
+        if args.yolo_process:
+            return YoloProcess(args.model, imgsz=args.imgsz, conf=args.conf, backend=args.backend,
+                               dynamic=adaptive_imgsz)
+        return make_detector(args.backend, args.model, imgsz=args.imgsz, conf=args.conf, dynamic=adaptive_imgsz)
+
+    detector, load_ms, first_ms, warm_ms = load_detector(create_detector, args.imgsz)
+    print(f"Model ready: cold start {load_ms:.0f} ms, first inference {first_ms:.0f} ms, warm {warm_ms:.0f} ms")
+    pan_tilt = PanTiltController(args.deadband, args.kp, args.ki, args.kd, max_rate=args.max_rate)
+    mot = MultiObjectTracker(max_age=args.max_age, high_conf=args.track_conf, low_conf=args.conf)
+    target_lock = TargetLock(target=args.target)
+    vision = detector
+    stages = []
+    adaptive = roi = hybrid = None
+    if adaptive_imgsz:
+        adaptive = vision = AdaptiveImgszDetector(vision, budget_ms=args.budget_ms, start=args.imgsz)
+        stages.append(vision)
+    if args.roi:
+        roi = vision = RoiDetector(vision, target=args.target, rescan_every=args.rescan_every,
+                                   min_conf=args.track_conf)
+        stages.append(vision)
+    if args.motion_threshold:
+        vision = MotionGatedDetector(vision, threshold=args.motion_threshold, refresh_every=args.motion_refresh)
+        stages.append(vision)
+    if args.detect_every != "1":
+        interval = None if args.detect_every == "auto" else int(args.detect_every)
+        hybrid = vision = HybridDetector(vision, target=args.target, interval=interval,
+                                         target_fps=args.target_fps, min_conf=args.track_conf)
+        stages.append(vision)
+
+    def process(frame):
+        # Runs in the frame worker thread
+        image = frame.decode()
+        if image is None:
+            return None
+        frame.mark("decode")
+        changes = adaptive.changes if adaptive else 0
+        detections = vision.detect(image)
+        frame.mark("vision")
+        if adaptive and adaptive.changes != changes:
+            print(adaptive.last_change)
+        target = target_lock.update(mot.update(detections), detector.names)
+        for stage in (roi, hybrid):
+            if stage:
+                stage.set_target(None if target is None else target.box)
+        if target is None:
+            pan_tilt.reset()
+        if target is None or target.time_since_update:
+            return []
+        return pan_tilt.move_towards(target.box, image.shape)
+
+    try:
+        run(HeadlessRunner(args, process, stop_commands=(), binary=args.binary))
+    finally:
+        for stage in stages:
+            print(stage.stats())
+        print(mot.stats())
+        print(pan_tilt.stats())
+        print(f"Target lock switched {target_lock.switches} times")
+        detector.close()
+
+
+if __name__ == "__main__":
+    main()
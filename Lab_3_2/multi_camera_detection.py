@@ -0,0 +1,170 @@
+"""YOLO detection for several ESP32-CAM robots with one batched model.
+
+    python multi_camera_detection.py --camera http://192.168.31.81/video --camera http://192.168.31.82/video
+
+A camera is VIDEO[,WS]: the MJPEG URL (or a video file, a folder of JPEGs,
+synthetic) and the command WebSocket, by default ws://<host>:81/ws for an
+ESP32 URL. The newest frame of every camera is batched into one forward
+pass; per-camera and aggregate fps, batch size and memory are printed.
+
+The boxes of every camera go to `--show` (an OpenCV window per camera)
+and/or `--jsonl` (one JSON line per frame), or to the `on_detections`
+callback of `run`. This replaces one GUI_YOLO_detection.py per robot,
+each with its own model; the GUIs themselves do not share a model.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlparse
+
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.connection import ConnectionManager  # noqa: E402
+from common.frame_source import MjpegHttpSource, open_source  # noqa: E402
+from common.latency import LatencyTracker  # noqa: E402
+from detection_service import BatchedDetectionService  # noqa: E402
+from detectors import BACKENDS, make_detector  # noqa: E402
+from tracking import draw_detections  # noqa: E402
+
+
+def parse_camera(spec):
+    video, _, ws = spec.partition(",")
+    if not ws and video.startswith("http"):
+        ws = f"ws://{urlparse(video).hostname}:81/ws"
+    return video, ws or None
+
+
+def rss_mb():
+    import psutil  # installed with ultralytics
+
+    return psutil.Process().memory_info().rss / 2 ** 20
+
+
+class Camera:
+    def __init__(self, name, video, ws_url, fps):
+        self.name = name
+        self.source = open_source(video, fps=fps, loop=True)
+        self.live = isinstance(self.source, MjpegHttpSource)
+        self.connection = ConnectionManager(ws_url, log=lambda msg: print(f"[{name}] {msg}")) if ws_url else None
+        self.latency = LatencyTracker()
+        self.detections = 0
+
+    async def stream(self, service):
+        if self.live and self.connection:
+            self.connection.start()
+            while not self.connection.connected:
+                await asyncio.sleep(0.1)
+            if not await self.connection.send("start"):
+                self.connection.log("Stream start not sent")
+        frames = self.connection.stream(self.source) if self.connection else self.source.frames()
+        async for frame in frames:
+            service.submit(self.name, frame)
+
+    async def close(self):
+        if self.connection:
+            if self.live:
+                await self.connection.send("stop")
+            await self.connection.close()
+
+
+class DetectionSink:
+    """Publishes the boxes of every camera: an OpenCV window each and/or JSON lines."""
+
+    def __init__(self, names, show=False, jsonl=None):
+        self.names = names
+        self.show = show
+        self.file = open(jsonl, "a") if jsonl else None
+
+    def __call__(self, camera, frame, image, detections):
+        if self.file:
+            boxes = [{"class": self.names[int(cls)], "conf": round(float(conf), 3),
+                      "box": [int(v) for v in (x1, y1, x2, y2)]}
+                     for x1, y1, x2, y2, conf, cls in detections.tolist()]
+            self.file.write(json.dumps({"camera": camera, "time": round(time.time(), 3), "boxes": boxes}) + "\n")
+        if self.show:
+            cv2.imshow(camera, draw_detections(image, detections, self.names))
+            cv2.waitKey(1)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        if self.show:
+            cv2.destroyAllWindows()
+
+
+async def print_stats(service, cameras, interval):
+    last_time = time.perf_counter()
+    last_counts = {camera.name: 0 for camera in cameras}
+    while True:
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        parts = []
+        total = 0
+        for camera in cameras:
+            count = camera.latency.recorded - last_counts[camera.name]
+            last_counts[camera.name] = camera.latency.recorded
+            total += count
+            parts.append(f"{camera.name} {count / (now - last_time):4.1f}")
+        print(f"fps {total / (now - last_time):5.1f} total ({', '.join(parts)}), "
+              f"{service.stats()}, RSS {rss_mb():.0f} MB")
+        last_time = now
+
+
+async def run(args, on_detections=None):
+    """`on_detections(camera, frame, image, detections)` gets every result; by default `--show`/`--jsonl`."""
+    cameras = [Camera(f"cam{i}", *parse_camera(spec), fps=args.fps) for i, spec in enumerate(args.camera)]
+    detector = make_detector(args.backend, args.model, args.imgsz, args.conf, dynamic=True)
+    sink = None
+    if on_detections is None and (args.show or args.jsonl):
+        sink = on_detections = DetectionSink(detector.names, show=args.show, jsonl=args.jsonl)
+    service = BatchedDetectionService(detector, [camera.name for camera in cameras], window=args.window)
+    by_name = {camera.name: camera for camera in cameras}
+
+    tasks = [asyncio.ensure_future(camera.stream(service)) for camera in cameras]
+    tasks.append(asyncio.ensure_future(print_stats(service, cameras, args.stats_interval)))
+    try:
+        async for name, frame, image, detections in service.results():
+            # Boxes are routed back to the camera the frame came from
+            camera = by_name[name]
+            camera.detections += len(detections)
+            if on_detections:
+                on_detections(name, frame, image, detections)
+            camera.latency.record(frame)
+    finally:
+        for task in tasks:
+            task.cancel()
+        service.shutdown()
+        if sink:
+            sink.close()
+        print(service.stats())
+        for camera in cameras:
+            print(f"{camera.name}: {camera.latency.recorded} frames, {camera.detections} detections")
+            await camera.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camera", action="append", required=True, help="VIDEO[,WS], repeat per robot")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS)
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--conf", type=float, default=0.5)
+    parser.add_argument("--window", type=float, default=0.015, help="seconds to wait for the other cameras")
+    parser.add_argument("--fps", type=float, default=None, help="pace offline sources")
+    parser.add_argument("--stats-interval", type=float, default=5.0)
+    parser.add_argument("--show", action="store_true", help="an OpenCV window with the boxes per camera")
+    parser.add_argument("--jsonl", help="append the boxes of every frame to this file, one JSON line each")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import time
+
+import cv2
+import numpy as np
+
+from tracking import TARGET_CLASS, class_color, iou_matrix
+
+# Noise of the constant-velocity model relative to the box size (as in DeepSORT)
+STD_POSITION = 1.0 / 20
+STD_VELOCITY = 1.0 / 160
+
+
+def greedy_match(ious, threshold):
+    """Pairs (row, col) by descending IoU, each row and column used once."""
+    matches = []
+    used_rows, used_cols = set(), set()
+    for flat in np.argsort(-ious, axis=None):
+        row, col = divmod(int(flat), ious.shape[1])
+        if ious[row, col] < threshold:
+            break
+        if row in used_rows or col in used_cols:
+            continue
+        matches.append((row, col))
+        used_rows.add(row)
+        used_cols.add(col)
+    return matches
+
+
+class Track:
+    """One object: Kalman filter on box center, size and their velocities."""
+
+    _F = np.eye(8)
+    _F[:4, 4:] = np.eye(4)
+    _H = np.eye(4, 8)
+
+    def __init__(self, row, track_id):
+        x1, y1, x2, y2 = row[:4]
+        w, h = x2 - x1, y2 - y1
+        self.x = np.array([x1 + w / 2, y1 + h / 2, w, h, 0, 0, 0, 0], dtype=np.float64)
+        std = np.array([2 * STD_POSITION * w, 2 * STD_POSITION * h, 2 * STD_POSITION * w, 2 * STD_POSITION * h,
+                        10 * STD_VELOCITY * w, 10 * STD_VELOCITY * h, 10 * STD_VELOCITY * w, 10 * STD_VELOCITY * h])
+        self.P = np.diag(std ** 2)
+        self.id = track_id
+        self.conf = float(row[4])
+        self.cls = int(row[5])
+        self.hits = 1
+        self.age = 1
+        self.time_since_update = 0
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    def _noise(self, pos, vel):
+        w, h = max(self.x[2], 1.0), max(self.x[3], 1.0)
+        return np.array([pos * w, pos * h, pos * w, pos * h, vel * w, vel * h, vel * w, vel * h]) ** 2
+
+    def predict(self):
+        self.x = self._F @ self.x
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+        self.P = self._F @ self.P @ self._F.T + np.diag(self._noise(STD_POSITION, STD_VELOCITY))
+        self.age += 1
+        self.time_since_update += 1
+
+    def update(self, row):
+        x1, y1, x2, y2 = row[:4]
+        z = np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+        R = np.diag(self._noise(STD_POSITION, 0)[:4])
+        S = self._H @ self.P @ self._H.T + R
+        K = np.linalg.solve(S, self._H @ self.P).T
+        self.x = self.x + K @ (z - self._H @ self.x)
+        self.P = self.P - K @ self._H @ self.P
+        self.conf = float(row[4])
+        self.hits += 1
+        self.time_since_update = 0
+
+
+class MultiObjectTracker:
+    """Associates detections across frames and gives every object a stable ID.
+
+    SORT with the ByteTrack second stage: tracks are predicted by their
+    Kalman filters and matched to detections by IoU (same class only),
+    first to detections with conf >= `high_conf`, then the leftover tracks
+    to the low-confidence ones, which only keep tracks alive. Unmatched
+    confident detections start new tracks; a track survives `max_age`
+    frames without a match (occlusion) and is reported once it has
+    `min_hits` matches.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=30, min_hits=3, high_conf=0.5, low_conf=0.1):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.high_conf = high_conf
+        self.low_conf = low_conf
+
+        self.tracks = []
+        self._next_id = 1
+        self.frames = 0
+        self.last_update_ms = 0.0
+
+    def _associate(self, tracks, detections, threshold):
+        if not tracks or not len(detections):
+            return [], list(range(len(tracks))), list(range(len(detections)))
+        ious = iou_matrix(np.array([t.box for t in tracks]), detections[:, :4])
+        classes = np.array([t.cls for t in tracks])
+        ious[classes[:, None] != detections[None, :, 5].astype(int)] = 0.0
+        matches = greedy_match(ious, threshold)
+        matched_rows = {row for row, _ in matches}
+        matched_cols = {col for _, col in matches}
+        return (matches,
+                [i for i in range(len(tracks)) if i not in matched_rows],
+                [j for j in range(len(detections)) if j not in matched_cols])
+
+    def update(self, detections):
+        """Feed the (N, 6) detections of one frame; returns the confirmed tracks."""
+        t0 = time.perf_counter()
+        self.frames += 1
+        for track in self.tracks:
+            track.predict()
+
+        conf = detections[:, 4] if len(detections) else np.zeros(0)
+        high = detections[conf >= self.high_conf]
+        low = detections[(conf >= self.low_conf) & (conf < self.high_conf)]
+
+        matches, unmatched_tracks, unmatched_high = self._associate(self.tracks, high, self.iou_threshold)
+        for row, col in matches:
+            self.tracks[row].update(high[col])
+
+        remaining = [self.tracks[i] for i in unmatched_tracks]
+        matches, _, _ = self._associate(remaining, low, 0.5)
+        for row, col in matches:
+            remaining[row].update(low[col])
+
+        for col in unmatched_high:
+            self.tracks.append(Track(high[col], self._next_id))
+            self._next_id += 1
+        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+
+        confirmed = [t for t in self.tracks if t.hits >= self.min_hits or self.frames <= self.min_hits]
+        self.last_update_ms = (time.perf_counter() - t0) * 1000.0
+        return confirmed
+
+    def stats(self):
+        return (f"Tracker: {len(self.tracks)} tracks, {self._next_id - 1} IDs issued, "
+                f"association {self.last_update_ms:.2f} ms")
+
+
+class TargetLock:
+    """Follows one track ID; the largest visible box of the target class is
+    chosen only when there is no lock or the locked track has been dropped."""
+
+    def __init__(self, target=TARGET_CLASS):
+        self.target = target
+        self.locked_id = None
+        self.switches = 0
+
+    def update(self, tracks, names):
+        for track in tracks:
+            if track.id == self.locked_id:
+                return track
+        candidates = [t for t in tracks if t.time_since_update == 0 and names[t.cls] == self.target]
+        if not candidates:
+            self.locked_id = None
+            return None
+        best = max(candidates, key=lambda t: t.x[2] * t.x[3])
+        self.locked_id = best.id
+        self.switches += 1
+        return best
+
+
+def draw_tracks(frame, tracks, names, locked_id=None):
+    """Track boxes labelled with their IDs; the locked one in white, coasting ones thin."""
+    for track in tracks:
+        x1, y1, x2, y2 = (int(v) for v in track.box)
+        locked = track.id == locked_id
+        color = (255, 255, 255) if locked else class_color(track.cls)
+        thickness = 1 if track.time_since_update else (3 if locked else 2)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+        cv2.putText(frame, f"#{track.id} {names[track.cls]} {track.conf:.2f}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
@@ -0,0 +1,285 @@
+"""PID pan/tilt control and a simulated camera mount to tune it offline.
+
+    python pan_tilt_control.py --fps 10 --kp 120 --ki 20 --kd 8
+    python pan_tilt_control.py --controller step      # the old 1-degree-per-frame stepping
+
+The simulation puts a target at a step offset, then moves it at a constant
+speed and along a sine, feeds the controller pixel errors delayed by the
+vision latency, applies its commands through the link latency and a servo
+with a limited slew rate, and prints settle time, overshoot, tracking error
+and the number of commands sent.
+"""
+import math
+import time
+import argparse
+
+from tracking import DEADBAND, PanTiltTracker
+
+ANGLE_MIN, ANGLE_MAX = 0, 180
+HFOV, VFOV = 66.0, 50.0  # degrees, OV2640 with the stock lens
+
+
+class PID:
+    """PID on a normalized error; the output is a servo speed in degrees per second.
+
+    The derivative is low-pass filtered (`smoothing` is the weight of the
+    previous value). The integral is clamped to `integral_limit` and frozen
+    by the caller while the output is saturated (anti-windup).
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, integral_limit=1.0, smoothing=0.7):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self._derivative = 0.0
+        self._last_error = None
+
+    def hold(self):
+        self._derivative = 0.0
+        self._last_error = None
+
+    def update(self, error, dt, integrate=True):
+        if integrate:
+            self.integral = max(-self.integral_limit, min(self.integral_limit, self.integral + error * dt))
+        if self._last_error is not None and dt > 0:
+            raw = (error - self._last_error) / dt
+            self._derivative = self.smoothing * self._derivative + (1.0 - self.smoothing) * raw
+        self._last_error = error
+        return self.kp * error + self.ki * self.integral + self.kd * self._derivative
+
+
+class _Axis:
+    """One servo: integrates the PID speed into an angle and decides when to send it."""
+
+    def __init__(self, name, pid, direction, angle):
+        self.name = name
+        self.pid = pid
+        self.direction = direction  # +1: a positive pixel error raises the angle
+        self.angle = float(angle)
+        self.sent = int(round(angle))
+        self.last_send = -math.inf
+
+    def update(self, error, dt):
+        if error is None:
+            # Within the deadband: hold still, keep the integral for when the target moves again
+            self.pid.hold()
+            return
+        speed = self.direction * self.pid.update(error, dt, integrate=not self._saturated(error))
+        self.angle = max(ANGLE_MIN, min(ANGLE_MAX, self.angle + speed * dt))
+
+    def _saturated(self, error):
+        # At a limit, integrating further in the same direction would only wind up
+        push = self.direction * error
+        return (self.angle >= ANGLE_MAX and push > 0) or (self.angle <= ANGLE_MIN and push < 0)
+
+    def command(self, now, min_step, min_interval):
+        target = int(round(self.angle))
+        if abs(target - self.sent) < min_step or now - self.last_send < min_interval:
+            return None
+        self.sent = target
+        self.last_send = now
+        return f"{self.name}:{target}"
+
+
+class PanTiltController:
+    """Centers a box with one PID per axis and rate-limited servo commands.
+
+    The pixel error is normalized by half the frame size, so the gains do not
+    depend on the resolution; errors within `deadband` px count as zero. A
+    command is sent when the rounded angle moved at least `min_step` degrees
+    since the last one and no more often than `max_rate` times per second per
+    axis. Call `reset` when the target is lost so the integral does not carry
+    over to the next one.
+    """
+
+    def __init__(self, deadband=DEADBAND, kp=120.0, ki=20.0, kd=8.0, min_step=1, max_rate=15.0,
+                 pan=90, tilt=90, max_dt=0.2):
+        self.deadband = deadband
+        self.min_step = min_step
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.max_dt = max_dt
+        # The target right of the center needs a smaller pan angle, below the center a larger tilt
+        self.pan = _Axis("pan", PID(kp, ki, kd), -1, pan)
+        self.tilt = _Axis("tilt", PID(kp, ki, kd), 1, tilt)
+        self._last_time = None
+
+        self.updates = 0
+        self.sent = 0
+
+    @property
+    def pan_angle(self):
+        return self.pan.sent
+
+    @property
+    def tilt_angle(self):
+        return self.tilt.sent
+
+    def reset(self):
+        self.pan.pid.reset()
+        self.tilt.pid.reset()
+        self._last_time = None
+
+    def move_towards(self, box, frame_shape, now=None):
+        """Servo commands that bring `box` towards the frame center."""
+        now = time.monotonic() if now is None else now
+        dt = self.max_dt if self._last_time is None else min(now - self._last_time, self.max_dt)
+        self._last_time = now
+        self.updates += 1
+
+        frame_h, frame_w = frame_shape[:2]
+        x1, y1, x2, y2 = box[:4]
+        offset_x = (x1 + x2) / 2 - frame_w / 2
+        offset_y = (y1 + y2) / 2 - frame_h / 2
+        self.pan.update(offset_x / (frame_w / 2) if abs(offset_x) > self.deadband else None, dt)
+        self.tilt.update(offset_y / (frame_h / 2) if abs(offset_y) > self.deadband else None, dt)
+
+        commands = [c for c in (self.pan.command(now, self.min_step, self.min_interval),
+                                self.tilt.command(now, self.min_step, self.min_interval)) if c]
+        self.sent += len(commands)
+        return commands
+
+    def stats(self):
+        return (f"Pan/tilt: {self.sent} commands for {self.updates} target updates, "
+                f"pan {self.pan.sent}, tilt {self.tilt.sent}")
+
+
+class SimulatedPanTilt:
+    """Camera on two hobby servos looking at a target given by its pan/tilt angles.
+
+    Commands reach the servos after `link_latency` s and each servo turns at
+    most `slew_rate` degrees per second; frames show the scene as it was
+    `vision_latency` s earlier.
+    """
+
+    def __init__(self, width=320, height=240, pan=90, tilt=90, slew_rate=300.0,
+                 link_latency=0.03, vision_latency=0.08):
+        self.width = width
+        self.height = height
+        self.slew_rate = slew_rate
+        self.link_latency = link_latency
+        self.vision_latency = vision_latency
+        self.position = [float(pan), float(tilt)]
+        self.setpoint = [float(pan), float(tilt)]
+        self._pending = []  # (apply_at, axis, angle)
+        self._history = []  # (time, pan, tilt)
+
+    def send(self, commands, now):
+        for command in commands:
+            axis, _, value = command.partition(":")
+            self._pending.append((now + self.link_latency, 0 if axis == "pan" else 1, float(value)))
+
+    def step(self, now, dt):
+        due = [p for p in self._pending if p[0] <= now]
+        self._pending = [p for p in self._pending if p[0] > now]
+        for _, axis, angle in due:
+            self.setpoint[axis] = angle
+        for axis in (0, 1):
+            delta = self.setpoint[axis] - self.position[axis]
+            limit = self.slew_rate * dt
+            self.position[axis] += max(-limit, min(limit, delta))
+        self._history.append((now, *self.position))
+
+    def box(self, target, now, size=40):
+        """Target box in the frame the vision pipeline sees at `now`."""
+        seen = now - self.vision_latency
+        _, pan, tilt = next((h for h in reversed(self._history) if h[0] <= seen), self._history[0])
+        # A larger pan angle turns the camera left, so the target drifts right in the frame
+        cx = self.width / 2 + (pan - target[0]) * self.width / HFOV
+        cy = self.height / 2 + (target[1] - tilt) * self.height / VFOV
+        return cx - size / 2, cy - size / 2, cx + size / 2, cy + size / 2
+
+
+def scenario(t):
+    """Target (pan, tilt) angles: a 20/10 degree step, a 15 deg/s sweep, then a 0.3 Hz sine."""
+    if t < 4.0:
+        return 110.0, 80.0
+    if t < 8.0:
+        return 110.0 - 15.0 * (t - 4.0), 80.0
+    return 50.0 + 20.0 * math.sin(2 * math.pi * 0.3 * (t - 8.0)), 80.0 + 8.0 * math.sin(2 * math.pi * 0.3 * (t - 8.0))
+
+
+def simulate(controller, plant, fps=10.0, duration=14.0, tolerance=3.0, physics_hz=200.0):
+    """Runs `controller` against `plant` on `scenario`; returns the tracking metrics.
+
+    The step has settled once both errors stay within `tolerance` degrees
+    (about the deadband).
+    """
+    # The step tracker moves one degree per frame; only the PID controller uses the frame time
+    timed = isinstance(controller, PanTiltController)
+    dt = 1.0 / physics_hz
+    frame_every = max(1, int(round(physics_hz / fps)))
+    plant.step(0.0, 0.0)
+    errors = []  # (time, pan error, tilt error) in degrees
+    last_outside = 0.0
+    peak = 0.0
+    sent = 0
+    for i in range(1, int(duration * physics_hz) + 1):
+        now = i * dt
+        plant.step(now, dt)
+        target = scenario(now)
+        pan_error = target[0] - plant.position[0]
+        tilt_error = target[1] - plant.position[1]
+        errors.append((now, pan_error, tilt_error))
+        if now < 4.0:
+            # The step asks for +20 degrees of pan; anything past the target is overshoot
+            peak = max(peak, -pan_error)
+            if abs(pan_error) > tolerance or abs(tilt_error) > tolerance:
+                last_outside = now
+        if i % frame_every == 0:
+            box, shape = plant.box(target, now), (plant.height, plant.width)
+            commands = controller.move_towards(box, shape, now=now) if timed else controller.move_towards(box, shape)
+            sent += len(commands)
+            plant.send(commands, now)
+
+    def rms(start, end):
+        window = [math.hypot(p, t) for now, p, t in errors if start <= now < end]
+        return math.sqrt(sum(e * e for e in window) / len(window))
+
+    return {
+        "settle_s": last_outside if last_outside < 3.9 else None,
+        "overshoot_deg": peak,
+        "sweep_rms_deg": rms(5.0, 8.0),
+        "sine_rms_deg": rms(9.0, duration),
+        "commands": sent,
+        "commands_per_s": sent / duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--controller", choices=("pid", "step"), default="pid")
+    parser.add_argument("--fps", type=float, default=10.0, help="vision rate")
+    parser.add_argument("--kp", type=float, default=120.0)
+    parser.add_argument("--ki", type=float, default=20.0)
+    parser.add_argument("--kd", type=float, default=8.0)
+    parser.add_argument("--deadband", type=int, default=DEADBAND)
+    parser.add_argument("--min-step", type=int, default=1, help="degrees between two commands")
+    parser.add_argument("--max-rate", type=float, default=15.0, help="commands per second per axis")
+    parser.add_argument("--slew-rate", type=float, default=300.0, help="servo speed, degrees per second")
+    parser.add_argument("--link-latency", type=float, default=0.03, help="seconds from send to the servo")
+    parser.add_argument("--vision-latency", type=float, default=0.08, help="age of the frame at detection, s")
+    args = parser.parse_args()
+
+    if args.controller == "step":
+        controller = PanTiltTracker(deadband=args.deadband)
+    else:
+        controller = PanTiltController(args.deadband, args.kp, args.ki, args.kd,
+                                       min_step=args.min_step, max_rate=args.max_rate)
+    plant = SimulatedPanTilt(slew_rate=args.slew_rate, link_latency=args.link_latency,
+                             vision_latency=args.vision_latency)
+    result = simulate(controller, plant, fps=args.fps)
+    settle = f"{result['settle_s']:.2f} s" if result["settle_s"] is not None else "not settled"
+    print(f"{args.controller} at {args.fps:g} fps: step settles in {settle}, "
+          f"overshoot {result['overshoot_deg']:.1f} deg")
+    print(f"tracking error RMS: sweep {result['sweep_rms_deg']:.1f} deg, sine {result['sine_rms_deg']:.1f} deg")
+    print(f"commands: {result['commands']} ({result['commands_per_s']:.1f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+import time
+
+import cv2
+import numpy as np
+
+TARGET_CLASS = "cell phone"
+DEADBAND = 10  # px around the frame center
+
+
+# Color per class id, built once; same colors as seeding np.random with the class id
+PALETTE = np.array([np.random.RandomState(cls_id).randint(0, 255, size=3) for cls_id in range(256)],
+                   dtype=np.int32)
+
+
+def class_color(cls_id):
+    return tuple(int(c) for c in PALETTE[cls_id % len(PALETTE)])
+
+
+def draw_detections(frame, detections, names, color=None):
+    """Boxes with labels; `color` None gives every class its own color."""
+    if not len(detections):
+        return frame
+    boxes = detections[:, :4].astype(np.int32).tolist()
+    confs = detections[:, 4].tolist()
+    classes = detections[:, 5].astype(np.int32)
+    colors = [color] * len(classes) if color else PALETTE[classes % len(PALETTE)].tolist()
+
+    for (x1, y1, x2, y2), conf, cls, box_color in zip(boxes, confs, classes.tolist(), colors):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), box_color, 2)
+        cv2.putText(frame, f"{names[cls]} {conf:.2f}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, box_color, 2)
+    return frame
+
+
+def iou_matrix(a, b):
+    """IoU of every box in `a` (N, 4) with every box in `b` (M, 4) as an (N, M) array."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def _target_rows(detections, names, target, min_conf):
+    if not len(detections):
+        return detections
+    target_ids = [cls_id for cls_id, name in names.items() if name == target]
+    mask = np.isin(detections[:, 5].astype(np.int32), target_ids) & (detections[:, 4] >= min_conf)
+    return detections[mask]
+
+
+def largest_target(detections, names, target=TARGET_CLASS, min_conf=0.0):
+    """Row of the biggest box of the target class or None."""
+    candidates = _target_rows(detections, names, target, min_conf)
+    if not len(candidates):
+        return None
+    areas = (candidates[:, 2] - candidates[:, 0]) * (candidates[:, 3] - candidates[:, 1])
+    return candidates[areas.argmax()]
+
+
+def pick_target(detections, names, target=TARGET_CLASS, box=None, min_conf=0.0, min_iou=0.1):
+    """Row to follow: the target box overlapping `box` (the locked track) most, or the largest one without a lock."""
+    if box is None:
+        return largest_target(detections, names, target, min_conf)
+    candidates = _target_rows(detections, names, target, min_conf)
+    if not len(candidates):
+        return None
+    ious = iou_matrix(np.asarray(box[:4], dtype=np.float32)[None], candidates[:, :4])[0]
+    best = ious.argmax()
+    return candidates[best] if ious[best] >= min_iou else None
+
+
+class PanTiltTracker:
+    """Steps pan/tilt by one degree towards the target while it is off-center."""
+
+    def __init__(self, target=TARGET_CLASS, deadband=DEADBAND, pan=90, tilt=90):
+        self.target = target
+        self.deadband = deadband
+        self.pan_angle = pan
+        self.tilt_angle = tilt
+
+    def update(self, detections, names, frame_shape):
+        """Returns the servo commands for this frame, following the largest target box."""
+        det = largest_target(detections, names, self.target)
+        if det is None:
+            return []
+        return self.move_towards(det[:4], frame_shape)
+
+    def move_towards(self, box, frame_shape):
+        """Servo commands that bring `box` towards the frame center."""
+        commands = []
+        frame_h, frame_w = frame_shape[:2]
+        x1, y1, x2, y2 = map(int, box)
+        offset_x = (x1 + x2) // 2 - frame_w // 2
+        offset_y = (y1 + y2) // 2 - frame_h // 2
+
+        if abs(offset_x) > self.deadband:
+            self.pan_angle += -1 if offset_x > 0 else 1
+            self.pan_angle = max(0, min(180, self.pan_angle))
+            commands.append(f"pan:{self.pan_angle}")
+
+        if abs(offset_y) > self.deadband:
+            self.tilt_angle += 1 if offset_y > 0 else -1
+            self.tilt_angle = max(0, min(180, self.tilt_angle))
+            commands.append(f"tilt:{self.tilt_angle}")
+
+        return commands
+
+
+class RoiDetector:
+    """Runs `detector` on a window around the locked target instead of the whole frame.
+
+    The window is a square `pad` box sizes around the last target box, at
+    least `min_window` px and rounded up to a multiple of 32, cut from the
+    frame at native resolution and mapped back to frame coordinates. Models
+    with a variable input size run it at the window size, so each pass is
+    cheaper. The whole frame is scanned again every `rescan_every` frames and
+    after `max_misses` windows without the target. Without `set_target`
+    the window follows the largest target box.
+    """
+
+    def __init__(self, detector, target=TARGET_CLASS, pad=1.5, min_window=160,
+                 rescan_every=30, max_misses=2, min_conf=0.0):
+        self.detector = detector
+        self.target = target
+        self.min_conf = min_conf
+        self.pad = pad
+        self.min_window = min_window
+        self.rescan_every = rescan_every
+        self.max_misses = max_misses
+
+        self._box = None
+        self._locked = None
+        self._misses = 0
+        self._since_scan = 0
+        self.window = None  # x1, y1, x2, y2 of the last ROI pass, None after a full scan
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.losses = 0
+
+    @property
+    def names(self):
+        return self.detector.names
+
+    def set_target(self, box):
+        """Centers the next windows on `box`, e.g. the locked track; None goes back to the largest target."""
+        self._locked = None if box is None else np.asarray(box[:4], dtype=np.float32)
+        if self._locked is not None and self._box is not None:
+            self._box = self._locked.copy()
+
+    def _window(self, frame_shape):
+        frame_h, frame_w = frame_shape[:2]
+        x1, y1, x2, y2 = self._box
+        side = max(self.min_window, int(max(x2 - x1, y2 - y1) * (1 + self.pad)))
+        side = -(-side // 32) * 32
+        if side >= min(frame_h, frame_w):
+            return None
+        cx, cy = int((x1 + x2) / 2), int((y1 + y2) / 2)
+        left = min(max(0, cx - side // 2), frame_w - side)
+        top = min(max(0, cy - side // 2), frame_h - side)
+        return left, top, left + side, top + side
+
+    def _full_scan(self, frame):
+        self.window = None
+        self.full_frames += 1
+        self._since_scan = 0
+        return self.detector.detect(frame)
+
+    def detect(self, frame):
+        window = None
+        if self._box is not None and self._since_scan < self.rescan_every:
+            window = self._window(frame.shape)
+
+        if window is None:
+            detections = self._full_scan(frame)
+        else:
+            x1, y1, x2, y2 = window
+            crop = frame[y1:y2, x1:x2]
+            if getattr(self.detector, "variable_imgsz", False):
+                detections = self.detector.detect(crop, imgsz=x2 - x1)
+            else:
+                detections = self.detector.detect(crop)
+            detections = detections.copy()
+            detections[:, [0, 2]] += x1
+            detections[:, [1, 3]] += y1
+            self.window = window
+            self.roi_frames += 1
+            self._since_scan += 1
+
+        target = pick_target(detections, self.names, self.target, self._locked, self.min_conf)
+        if target is not None:
+            self._box = target[:4].copy()
+            self._misses = 0
+        elif self._box is not None:
+            self._misses += 1
+            if self._misses > self.max_misses or window is None:
+                # Lost: the next frame is a full-frame re-acquisition scan
+                self._box = None
+                self.losses += 1
+        return detections
+
+    def stats(self):
+        total = self.roi_frames + self.full_frames
+        return (f"ROI inference: {self.roi_frames}/{total} frames on the target window, "
+                f"{self.full_frames} full-frame scans, target lost {self.losses} times")
+
+    def close(self):
+        self.detector.close()
+
+
+class FlowBoxTracker:
+    """Follows one box between frames with sparse Lucas-Kanade optical flow.
+
+    Corners inside the box are tracked forward and back; points whose
+    forward-backward error is small move the box by their median shift and
+    rescale it by the median change of their spread. `quality` is the share
+    of points that survived.
+    """
+
+    def __init__(self, max_points=40, fb_threshold=1.0):
+        self.max_points = max_points
+        self.fb_threshold = fb_threshold
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.stop()
+
+    @property
+    def active(self):
+        return self.points is not None
+
+    def start(self, gray, box):
+        h, w = gray.shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in box)
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            self.stop()
+            return False
+        mask = np.zeros_like(gray)
+        mask[y1:y2, x1:x2] = 255
+        points = cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, 3, mask=mask)
+        if points is None or len(points) < 4:
+            self.stop()
+            return False
+        self.prev = gray
+        self.points = points
+        self.box = np.array([x1, y1, x2, y2], dtype=np.float32)
+        return True
+
+    def stop(self):
+        self.prev = None
+        self.points = None
+        self.box = None
+
+    def update(self, gray):
+        """Returns (box, quality); box is None when the target is lost."""
+        if self.points is None:
+            return None, 0.0
+        new, status, _ = cv2.calcOpticalFlowPyrLK(self.prev, gray, self.points, None, **self.lk_params)
+        back, status_back, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev, new, None, **self.lk_params)
+        fb_error = np.linalg.norm((self.points - back).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (status_back.ravel() == 1) & (fb_error < self.fb_threshold)
+        quality = float(good.mean())
+        if good.sum() < 4:
+            self.stop()
+            return None, quality
+
+        old_pts = self.points[good].reshape(-1, 2)
+        new_pts = new[good].reshape(-1, 2)
+        dx, dy = np.median(new_pts - old_pts, axis=0)
+        old_spread = np.linalg.norm(old_pts - old_pts.mean(axis=0), axis=1)
+        new_spread = np.linalg.norm(new_pts - new_pts.mean(axis=0), axis=1)
+        valid = old_spread > 1.0
+        scale = float(np.median(new_spread[valid] / old_spread[valid])) if valid.any() else 1.0
+
+        x1, y1, x2, y2 = self.box
+        cx, cy = (x1 + x2) / 2 + dx, (y1 + y2) / 2 + dy
+        half_w, half_h = (x2 - x1) * scale / 2, (y2 - y1) * scale / 2
+        self.box = np.array([cx - half_w, cy - half_h, cx + half_w, cy + half_h], dtype=np.float32)
+        self.prev = gray
+        self.points = new_pts.reshape(-1, 1, 2)
+        return self.box, quality
+
+
+class HybridDetector:
+    """Runs `detector` every N frames and follows the target with optical flow in between.
+
+    Same interface as the detectors: on tracked frames `detect` returns one
+    row for the target, its confidence scaled by the flow quality. YOLO runs
+    again after N frames, when the target is lost or the quality drops below
+    `min_quality`. The target is the box matching `set_target` (the locked
+    track), else the largest one. With `interval=None` N is chosen from the measured
+    detector and tracker latency so the mean cost per frame fits `target_fps`.
+    """
+
+    def __init__(self, detector, target=TARGET_CLASS, interval=None, target_fps=30.0,
+                 max_interval=15, min_quality=0.6, min_conf=0.0, min_iou=0.3):
+        self.detector = detector
+        self.target = target
+        self.min_conf = min_conf
+        self.min_iou = min_iou
+        self.fixed_interval = interval
+        self.interval = interval or 1
+        self.target_fps = target_fps
+        self.max_interval = max_interval
+        self.min_quality = min_quality
+        self.flow = FlowBoxTracker()
+
+        self._row = None  # last target detection: x1, y1, x2, y2, conf, cls
+        self._locked = None
+        self._since_detect = 0
+        self.detect_ms = None
+        self.track_ms = None
+        self.last_detected = True
+        self.detections = 0
+        self.tracked = 0
+
+    @property
+    def names(self):
+        return self.detector.names
+
+    def set_target(self, box):
+        """Follows `box` (the locked track); when the flow is on another object YOLO runs on the next frame."""
+        self._locked = None if box is None else np.asarray(box[:4], dtype=np.float32)
+        if self._locked is not None and self.flow.active:
+            if iou_matrix(self._locked[None], self.flow.box[None])[0, 0] < self.min_iou:
+                self.flow.stop()
+
+    @staticmethod
+    def _ema(current, value, alpha=0.2):
+        return value if current is None else current + alpha * (value - current)
+
+    def _choose_interval(self):
+        if self.fixed_interval:
+            return self.fixed_interval
+        if self.detect_ms is None:
+            return self.interval
+        period = 1000.0 / self.target_fps
+        track_ms = self.track_ms or 0.0
+        if self.detect_ms <= period:
+            return 1
+        if track_ms >= period:
+            return self.max_interval
+        # (detect + (N - 1) * track) / N <= period
+        needed = int(np.ceil((self.detect_ms - track_ms) / (period - track_ms)))
+        return max(1, min(self.max_interval, needed))
+
+    def detect(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.flow.active and self._since_detect < self.interval - 1:
+            t0 = time.perf_counter()
+            box, quality = self.flow.update(gray)
+            self.track_ms = self._ema(self.track_ms, (time.perf_counter() - t0) * 1000.0)
+            if box is not None and quality >= self.min_quality:
+                self._since_detect += 1
+                self.tracked += 1
+                self.last_detected = False
+                row = np.array([[*box, self._row[4] * quality, self._row[5]]], dtype=np.float32)
+                return row
+
+        t0 = time.perf_counter()
+        detections = self.detector.detect(frame)
+        # Frames a motion gate answered from its cache say nothing about the model latency
+        if getattr(self.detector, "last_inferred", True):
+            self.detect_ms = self._ema(self.detect_ms, (time.perf_counter() - t0) * 1000.0)
+        self._since_detect = 0
+        self.detections += 1
+        self.last_detected = True
+
+        self._row = pick_target(detections, self.names, self.target, self._locked, self.min_conf)
+        if self._row is None or not self.flow.start(gray, self._row[:4]):
+            self.flow.stop()
+        self.interval = self._choose_interval()
+        return detections
+
+    def stats(self):
+        total = self.detections + self.tracked
+        track_ms = f"{self.track_ms:.1f}" if self.track_ms is not None else "-"
+        detect_ms = f"{self.detect_ms:.1f}" if self.detect_ms is not None else "-"
+        return (f"Hybrid tracking: YOLO on {self.detections}/{total} frames, every {self.interval}, "
+                f"detect {detect_ms} ms, optical flow {track_ms} ms")
+
+    def close(self):
+        self.detector.close()
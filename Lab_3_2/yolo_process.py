@@ -0,0 +1,139 @@
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# The biggest ESP32-CAM frame (UXGA) fits into the frame buffer
+MAX_FRAME_SHAPE = (1200, 1600, 3)
+MAX_DETECTIONS = 300
+DET_FIELDS = 6  # x1, y1, x2, y2, conf, cls
+
+STARTUP_TIMEOUT = 120.0
+INFERENCE_TIMEOUT = 10.0
+
+
+def _worker_main(model_path, frame_shm_name, det_shm_name, conn, imgsz, conf, backend, dynamic):
+    from detectors import make_detector
+
+    frame_shm = shared_memory.SharedMemory(name=frame_shm_name)
+    det_shm = shared_memory.SharedMemory(name=det_shm_name)
+    detections = np.ndarray((MAX_DETECTIONS, DET_FIELDS), dtype=np.float32, buffer=det_shm.buf)
+    frame = None
+    try:
+        detector = make_detector(backend, model_path, imgsz, conf, dynamic)
+        conn.send(("ready", dict(detector.names)))
+
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            seq, h, w, size = msg
+            frame = np.ndarray((h, w, 3), dtype=np.uint8, buffer=frame_shm.buf)
+
+            t0 = time.perf_counter()
+            data = detector.detect(frame, imgsz=size) if size else detector.detect(frame)
+            data = data[:MAX_DETECTIONS, :DET_FIELDS]
+            infer_ms = (time.perf_counter() - t0) * 1000.0
+
+            detections[:len(data)] = data
+            conn.send((seq, len(data), infer_ms))
+    finally:
+        # Views must be released before the shared memory can be closed
+        frame = detections = None
+        frame_shm.close()
+        det_shm.close()
+
+
+class YoloProcess:
+    """YOLO model running in a separate process.
+
+    Frames are written into a shared memory buffer and detections come back
+    through another one as an (N, 6) float32 array of x1, y1, x2, y2, conf,
+    cls. Only the frame shape, sequence number and timings go through the pipe.
+    """
+
+    def __init__(self, model_path, imgsz=320, conf=0.5, backend="torch", dynamic=False):
+        self.imgsz = imgsz
+        # Another input size per frame works with ultralytics and dynamic exports
+        self.variable_imgsz = backend == "torch" or dynamic
+        self.names = {}
+        self.ready = False
+
+        self._frame_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(MAX_FRAME_SHAPE)))
+        self._det_shm = shared_memory.SharedMemory(create=True, size=MAX_DETECTIONS * DET_FIELDS * 4)
+        self._frame_buf = np.ndarray((self._frame_shm.size,), dtype=np.uint8, buffer=self._frame_shm.buf)
+        self._detections = np.ndarray((MAX_DETECTIONS, DET_FIELDS), dtype=np.float32, buffer=self._det_shm.buf)
+
+        self._conn, child_conn = mp.Pipe()
+        self._process = mp.Process(
+            target=_worker_main,
+            args=(model_path, self._frame_shm.name, self._det_shm.name, child_conn,
+                  imgsz, conf, backend, dynamic),
+            daemon=True,
+        )
+        self._process.start()
+        self._seq = 0
+
+        self.frames = 0
+        self.last_infer_ms = 0.0
+        self.last_handoff_ms = 0.0
+        self.total_handoff_ms = 0.0
+
+    def wait_ready(self, timeout=STARTUP_TIMEOUT):
+        if self.ready:
+            return True
+        if not self._conn.poll(timeout):
+            return False
+        _, self.names = self._conn.recv()
+        self.ready = True
+        return True
+
+    def detect(self, frame, imgsz=None):
+        """Return detections for a BGR frame as an (N, 6) float32 array."""
+        if not self.wait_ready():
+            raise RuntimeError("YOLO process did not start")
+        h, w = frame.shape[:2]
+        if frame.nbytes > self._frame_buf.size:
+            raise ValueError(f"Frame {w}x{h} does not fit into the shared buffer")
+
+        t0 = time.perf_counter()
+        self._seq += 1
+        self._frame_buf[:frame.nbytes].reshape(frame.shape)[...] = frame
+        self._conn.send((self._seq, h, w, imgsz or 0))
+        seq = None
+        while seq != self._seq:
+            # Replies to requests that timed out earlier are skipped
+            if not self._conn.poll(INFERENCE_TIMEOUT):
+                raise RuntimeError("YOLO process is not responding")
+            seq, count, infer_ms = self._conn.recv()
+        detections = self._detections[:count].copy()
+        total_ms = (time.perf_counter() - t0) * 1000.0
+
+        self.frames += 1
+        self.last_infer_ms = infer_ms
+        self.last_handoff_ms = total_ms - infer_ms
+        self.total_handoff_ms += self.last_handoff_ms
+        return detections
+
+    def stats(self):
+        mean = self.total_handoff_ms / self.frames if self.frames else 0.0
+        return (f"YOLO process: {self.frames} frames, inference {self.last_infer_ms:.1f} ms, "
+                f"handoff {self.last_handoff_ms:.2f} ms (mean {mean:.2f} ms)")
+
+    def close(self):
+        if self._frame_shm is None:
+            return
+        if self._process.is_alive():
+            try:
+                self._conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout=2.0)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._frame_buf = self._detections = None
+        for shm in (self._frame_shm, self._det_shm):
+            shm.close()
+            shm.unlink()
+        self._frame_shm = self._det_shm = None
@@ -0,0 +1 @@
+# Shared helpers for the lab GUIs (video stream, networking, measurements)
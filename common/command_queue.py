@@ -0,0 +1,146 @@
+import time
+import asyncio
+from collections import deque
+
+URGENT_COMMANDS = {"halt", "stop"}
+DRIVE_COMMANDS = {"w", "a", "s", "d"}
+SERVO_PREFIXES = ("pan:", "tilt:", "pt:")
+
+
+def command_kind(message):
+    """"drive", "pan", "tilt" or "pt" for commands that only the latest value of matters, else None."""
+    if message in DRIVE_COMMANDS:
+        return "drive"
+    if message.startswith(SERVO_PREFIXES):
+        return message.split(":", 1)[0]
+    return None
+
+
+def supersedes(kind, pending):
+    """Whether a command of `kind` makes a pending command of kind `pending` obsolete."""
+    if kind is None or pending is None:
+        return False
+    return kind == pending or (kind == "pt" and pending in ("pan", "tilt"))
+
+
+class CommandQueue:
+    """The single outbound command channel of one connection.
+
+    Messages go out one at a time in submission order, except urgent ones
+    ("halt", "stop"): they jump ahead of everything pending and drop the
+    pending drive commands, which they override anyway; a repeated urgent
+    message replaces the pending one. Servo angles are absolute and stay
+    queued. At `max_depth` pending messages a new one first drops the
+    oldest pending command of its own kind (drive, pan, tilt; "pt" covers
+    both axes), else the oldest command that a later one of its kind
+    already replaces; when every pending message is still needed the new
+    one is rejected. `put` returns a future that resolves to True once the
+    message is written and to False if it was dropped or the write failed;
+    write errors go to `on_error(message, error)` instead of the caller.
+    """
+
+    def __init__(self, write, max_depth=16, window=200, on_error=None):
+        self.write = write
+        self.max_depth = max_depth
+        self.on_error = on_error
+
+        self._urgent = deque()
+        self._normal = deque()  # (message, enqueued_at, future)
+        self._ready = asyncio.Event()
+
+        self.sent = 0
+        self.preempted = 0
+        self.overflowed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.max_seen_depth = 0
+        self._latencies = deque(maxlen=window)
+
+    @property
+    def depth(self):
+        return len(self._urgent) + len(self._normal)
+
+    def put(self, message):
+        future = asyncio.get_event_loop().create_future()
+        item = (message, time.perf_counter(), future)
+        if message in URGENT_COMMANDS:
+            self._drop(self._normal, lambda m: m in DRIVE_COMMANDS, "preempted")
+            self._drop(self._urgent, lambda m: m == message, "preempted")
+            self._urgent.append(item)
+        else:
+            if self.depth >= self.max_depth and not self._make_room(message):
+                self.rejected += 1
+                future.set_result(False)
+                return future
+            self._normal.append(item)
+        self.max_seen_depth = max(self.max_seen_depth, self.depth)
+        self._ready.set()
+        return future
+
+    def _drop(self, queue, predicate, counter):
+        kept = [item for item in queue if not predicate(item[0])]
+        for item in queue:
+            if predicate(item[0]):
+                item[2].set_result(False)
+        setattr(self, counter, getattr(self, counter) + len(queue) - len(kept))
+        queue.clear()
+        queue.extend(kept)
+
+    def _make_room(self, message):
+        kind = command_kind(message)
+        kinds = [command_kind(item[0]) for item in self._normal]
+        victim = next((i for i, pending in enumerate(kinds) if supersedes(kind, pending)), None)
+        if victim is None:
+            victim = next((i for i, pending in enumerate(kinds)
+                           if any(supersedes(later, pending) for later in kinds[i + 1:])), None)
+        if victim is None:
+            return False
+        item = self._normal[victim]
+        del self._normal[victim]
+        item[2].set_result(False)
+        self.overflowed += 1
+        return True
+
+    async def run(self):
+        """Sender loop, one per connection."""
+        while True:
+            await self._ready.wait()
+            queue = self._urgent or self._normal
+            if not queue:
+                self._ready.clear()
+                continue
+            message, enqueued_at, future = queue.popleft()
+            if future.cancelled():
+                continue
+            try:
+                await self.write(message)
+            except Exception as e:
+                self.failed += 1
+                if self.on_error:
+                    self.on_error(message, e)
+                if not future.done():
+                    future.set_result(False)
+                continue
+            self.sent += 1
+            self._latencies.append((time.perf_counter() - enqueued_at) * 1000.0)
+            if not future.done():
+                future.set_result(True)
+
+    def clear(self):
+        """Drops everything still pending."""
+        for queue in (self._urgent, self._normal):
+            while queue:
+                future = queue.popleft()[2]
+                if not future.done():
+                    future.set_result(False)
+
+    def stats(self):
+        text = (f"Command queue: {self.sent} sent, max depth {self.max_seen_depth}, "
+                f"dropped {self.preempted} (preempted by halt/stop) + {self.overflowed} (replaced, queue full) "
+                f"+ {self.rejected} (rejected, queue full), {self.failed} write errors")
+        if self._latencies:
+            latencies = sorted(self._latencies)
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            text += f", send latency p50 {p50:.1f} / p95 {p95:.1f} ms"
+        return text
@@ -0,0 +1,213 @@
+import time
+import random
+import asyncio
+
+import aiohttp
+import websockets
+
+from common.command_queue import CommandQueue
+from common.frame_source import MjpegHttpSource
+from common import protocol
+
+
+class Backoff:
+    """Jittered exponential backoff: base * 2^attempt, capped, scaled by 0.5..1."""
+
+    def __init__(self, base=0.5, cap=10.0):
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def next_delay(self):
+        delay = min(self.cap, self.base * 2 ** self.attempt)
+        self.attempt += 1
+        return delay * random.uniform(0.5, 1.0)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class ConnectionManager:
+    """Long-lived connections to one ESP32-CAM.
+
+    Keeps the command WebSocket open (reconnecting with backoff) and one
+    aiohttp session with a keep-alive TCP connector for the MJPEG stream.
+    `stream()` resumes a dropped live stream, re-sending `start`, and
+    records how long each video blackout lasted. All commands go through
+    one prioritized `CommandQueue` (see `send`). With `binary` they are sent
+    as `common.protocol` frames and the acks give the command-to-actuation
+    latency; reconnect and resume messages stay text.
+    """
+
+    def __init__(self, ws_url, on_message=None, log=print, base_delay=0.5, max_delay=10.0, max_queue=16,
+                 binary=False):
+        self.ws_url = ws_url
+        self.on_message = on_message
+        self.log = log
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.ws = None
+        self.session = None
+        self.streaming = False
+        self._ws_task = None
+        self._was_connected = False
+        self.commands = CommandQueue(self._write, max_depth=max_queue, on_error=self._write_error)
+        self._send_task = None
+        self.binary = binary
+        self.acks = protocol.AckTracker()
+        self._seq = 0
+
+        self.ws_reconnects = 0
+        self.stream_resumes = 0
+        self.blackouts = []  # seconds without video, one per resume
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed
+
+    def start(self):
+        if self._ws_task is None:
+            self._ws_task = asyncio.ensure_future(self._ws_loop())
+        if self._send_task is None:
+            self._send_task = asyncio.ensure_future(self.commands.run())
+
+    def http_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=2, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def send(self, message):
+        """Queues `message`; True once it is written.
+
+        False when not connected, when a newer command made it obsolete or
+        when the write failed (logged here); it does not raise for those.
+        """
+        if not self.connected:
+            return False
+        if self._send_task is None:
+            self._send_task = asyncio.ensure_future(self.commands.run())
+        return await self.commands.put(message)
+
+    async def _write(self, message):
+        if not self.connected:
+            raise ConnectionError("WebSocket not connected")
+        if not self.binary:
+            await self.ws.send(message)
+            return
+        self._seq = (self._seq + 1) & 0xFFFF
+        frame = protocol.encode_text(message, self._seq)
+        self.acks.sent(self._seq, message)
+        await self.ws.send(frame)
+
+    def _write_error(self, message, error):
+        self.log(f"Send error ({message}): {error}")
+
+    def _on_frame(self, data):
+        try:
+            packet = protocol.decode(data)
+        except protocol.ProtocolError as e:
+            self.log(f"Bad frame from ESP32: {e}")
+            return
+        if packet.opcode not in (protocol.OP_ACK, protocol.OP_NACK):
+            return
+        result = self.acks.received(packet)
+        if result and packet.opcode == protocol.OP_NACK:
+            self.log(f"ESP32 rejected: {result[0]}")
+
+    # -------------------------- WebSocket --------------------------
+    async def _ws_loop(self):
+        backoff = Backoff(self.base_delay, self.max_delay)
+        while True:
+            try:
+                self.ws = await websockets.connect(self.ws_url)
+            except Exception as e:
+                self.log(f"WebSocket error: {e}")
+                await asyncio.sleep(backoff.next_delay())
+                continue
+
+            if self._was_connected:
+                self.ws_reconnects += 1
+            self._was_connected = True
+            backoff.reset()
+            self.log("Connected to WebSocket")
+            if self.streaming:
+                # The board may have rebooted, ask for the stream again
+                await self.ws.send("start")
+
+            try:
+                async for message in self.ws:
+                    if isinstance(message, bytes):
+                        self._on_frame(message)
+                    elif self.on_message:
+                        self.on_message(message)
+                self.log("WebSocket closed")
+            except Exception as e:
+                self.log(f"WebSocket lost: {e}")
+            self.ws = None
+            await asyncio.sleep(backoff.next_delay())
+
+    # -------------------------- Video --------------------------
+    async def stream(self, source):
+        """Frames of `source`; live ESP32 streams are resumed after a drop."""
+        if not isinstance(source, MjpegHttpSource):
+            async for frame in source.frames():
+                yield frame
+            return
+
+        source.session = self.http_session()
+        backoff = Backoff(self.base_delay, self.max_delay)
+        lost_at = None
+        self.streaming = True
+        try:
+            while True:
+                try:
+                    async for frame in source.frames():
+                        if lost_at is not None:
+                            self.blackouts.append(time.perf_counter() - lost_at)
+                            self.log(f"Video resumed after {self.blackouts[-1]:.1f} s")
+                            lost_at = None
+                            backoff.reset()
+                        yield frame
+                    self.log("Video stream ended")
+                except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError) as e:
+                    self.log(f"Video error: {e}")
+
+                if lost_at is None:
+                    lost_at = time.perf_counter()
+                self.stream_resumes += 1
+                await asyncio.sleep(backoff.next_delay())
+                if self.connected:
+                    try:
+                        await self.ws.send("start")
+                    except Exception as e:
+                        self.log(f"WebSocket error: {e}")
+        finally:
+            self.streaming = False
+
+    def stats(self):
+        text = f"WebSocket reconnects: {self.ws_reconnects}, stream resumes: {self.stream_resumes}"
+        if self.blackouts:
+            text += (f", video blackouts: {len(self.blackouts)} "
+                     f"(mean {sum(self.blackouts) / len(self.blackouts):.1f} s, "
+                     f"max {max(self.blackouts):.1f} s)")
+        text += "\n" + self.commands.stats()
+        if self.binary:
+            text += "\n" + self.acks.stats()
+        return text
+
+    async def close(self):
+        if self._ws_task:
+            self._ws_task.cancel()
+            self._ws_task = None
+        if self._send_task:
+            self._send_task.cancel()
+            self._send_task = None
+        self.commands.clear()
+        if self.ws:
+            await self.ws.close()
+            self.ws = None
+        if self.session:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,209 @@
+import os
+import glob
+import time
+import asyncio
+
+import cv2
+import numpy as np
+
+from common.mjpeg import MjpegParser, boundary_from_content_type
+
+# cv2.imdecode flags that decode straight to grayscale at 1/scale resolution
+REDUCED_GRAYSCALE = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+class Frame:
+    """One video frame, either still JPEG encoded or an already decoded BGR image.
+
+    `marks` holds time.perf_counter() stamps of the pipeline stages the frame
+    went through (arrival, parse, decode, vision, send, paint).
+    """
+
+    __slots__ = ("seq", "timestamp", "jpeg", "image", "marks")
+
+    def __init__(self, seq, timestamp, jpeg=None, image=None, arrival=None):
+        self.seq = seq
+        self.timestamp = timestamp  # time.perf_counter() when the frame was received
+        self.jpeg = jpeg
+        self.image = image
+        self.marks = {"arrival": timestamp if arrival is None else arrival, "parse": timestamp}
+
+    def mark(self, stage):
+        self.marks[stage] = time.perf_counter()
+
+    def decode(self):
+        if self.image is not None:
+            return self.image
+        return cv2.imdecode(np.frombuffer(self.jpeg, np.uint8), cv2.IMREAD_COLOR)
+
+    def decode_gray(self, scale=1):
+        if self.jpeg is not None:
+            return cv2.imdecode(np.frombuffer(self.jpeg, np.uint8), REDUCED_GRAYSCALE[scale])
+        gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        if scale == 1:
+            return gray
+        h, w = gray.shape
+        return cv2.resize(gray, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+
+
+class FrameSource:
+    """Base class: `frames()` is an async generator of `Frame` objects."""
+
+    def __init__(self, fps=None):
+        self.fps = fps  # None: as fast as the consumer takes them
+        self.seq = 0
+
+    def _frame(self, jpeg=None, image=None, arrival=None):
+        self.seq += 1
+        return Frame(self.seq, time.perf_counter(), jpeg, image, arrival)
+
+    async def _pace(self, next_time):
+        # Returns the time of the following frame
+        if not self.fps:
+            await asyncio.sleep(0)
+            return next_time
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return max(next_time, time.perf_counter() - 1.0 / self.fps) + 1.0 / self.fps
+
+    async def frames(self):
+        raise NotImplementedError
+        yield
+
+    def close(self):
+        pass
+
+
+class MjpegHttpSource(FrameSource):
+    """MJPEG stream of the ESP32-CAM `/video` endpoint."""
+
+    def __init__(self, url, session=None):
+        super().__init__()
+        self.url = url
+        self.session = session
+
+    async def frames(self):
+        import aiohttp
+
+        session = self.session or aiohttp.ClientSession()
+        try:
+            async with session.get(self.url) as resp:
+                if resp.status != 200:
+                    raise ConnectionError(f"HTTP error: {resp.status}")
+                parser = MjpegParser(boundary_from_content_type(resp.headers.get("Content-Type")))
+                while True:
+                    chunk = await resp.content.readany()
+                    if not chunk:
+                        break
+                    arrival = time.perf_counter()
+                    for jpeg in parser.feed(chunk):
+                        yield self._frame(jpeg=jpeg, arrival=arrival)
+        finally:
+            if session is not self.session:
+                await session.close()
+
+
+class VideoFileSource(FrameSource):
+    """Frames of a local video file, decoded by OpenCV in a thread."""
+
+    def __init__(self, path, fps=None, loop=False):
+        super().__init__(fps)
+        self.path = path
+        self.loop = loop
+
+    async def frames(self):
+        capture = cv2.VideoCapture(self.path)
+        if not capture.isOpened():
+            raise FileNotFoundError(f"Cannot open video: {self.path}")
+        ev_loop = asyncio.get_event_loop()
+        next_time = time.perf_counter()
+        try:
+            while True:
+                ok, image = await ev_loop.run_in_executor(None, capture.read)
+                if not ok:
+                    if not self.loop:
+                        break
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                next_time = await self._pace(next_time)
+                yield self._frame(image=image)
+        finally:
+            capture.release()
+
+
+class ImageDirSource(FrameSource):
+    """JPEG files of a directory in name order, e.g. a recorded stream."""
+
+    def __init__(self, directory, fps=None, loop=False):
+        super().__init__(fps)
+        self.paths = sorted(glob.glob(os.path.join(directory, "*.jpg")) +
+                            glob.glob(os.path.join(directory, "*.jpeg")))
+        if not self.paths:
+            raise FileNotFoundError(f"No JPEG files in {directory}")
+        self.loop = loop
+
+    async def frames(self):
+        next_time = time.perf_counter()
+        while True:
+            for path in self.paths:
+                with open(path, "rb") as f:
+                    jpeg = f.read()
+                next_time = await self._pace(next_time)
+                yield self._frame(jpeg=jpeg)
+            if not self.loop:
+                break
+
+
+class SyntheticSource(FrameSource):
+    """Generated frames: a dark line and a moving box on a noisy background."""
+
+    def __init__(self, width=320, height=240, fps=None, count=None, encode=True, quality=80):
+        super().__init__(fps)
+        self.width = width
+        self.height = height
+        self.count = count
+        self.encode = encode
+        self.quality = quality
+        self._rng = np.random.default_rng(0)
+
+    def render(self, index):
+        w, h = self.width, self.height
+        image = self._rng.integers(110, 126, size=(h, w, 3), dtype=np.uint8)
+        shift = int(w * 0.35 * np.sin(index / 10.0))
+        cv2.line(image, (w // 2, h), (w // 2 + shift, h // 3), (20, 20, 20), max(2, w // 50))
+        bx = int((w - w // 6) * (0.5 + 0.5 * np.cos(index / 15.0)))
+        cv2.rectangle(image, (bx, h // 8), (bx + w // 6, h // 8 + h // 5), (40, 40, 200), -1)
+        return image
+
+    async def frames(self):
+        next_time = time.perf_counter()
+        index = 0
+        while self.count is None or index < self.count:
+            image = self.render(index)
+            index += 1
+            next_time = await self._pace(next_time)
+            if self.encode:
+                ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                yield self._frame(jpeg=jpeg.tobytes())
+            else:
+                yield self._frame(image=image)
+
+
+def open_source(spec, fps=None, loop=False):
+    """Create a source from a URL, a video file, a JPEG directory or `synthetic[:WxH]`."""
+    if spec.startswith(("http://", "https://")):
+        return MjpegHttpSource(spec)
+    if spec.startswith("synthetic"):
+        width, height = 320, 240
+        if ":" in spec:
+            width, height = map(int, spec.split(":", 1)[1].lower().split("x"))
+        return SyntheticSource(width, height, fps=fps)
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, fps=fps, loop=loop)
+    return VideoFileSource(spec, fps=fps, loop=loop)
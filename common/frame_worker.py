@@ -0,0 +1,91 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LatestFrameSlot:
+    """Single-item mailbox: a new frame replaces the one not yet taken."""
+
+    def __init__(self):
+        self._item = None
+        self._event = asyncio.Event()
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        if self._item is not None:
+            self.dropped += 1
+        self._item = item
+        self.put_count += 1
+        self._event.set()
+
+    async def get(self):
+        while self._item is None:
+            self._event.clear()
+            await self._event.wait()
+        item, self._item = self._item, None
+        return item
+
+    @property
+    def pending(self):
+        return self._item is not None
+
+    def take(self):
+        """Non-blocking get, None when there is nothing new."""
+        item, self._item = self._item, None
+        return item
+
+    def clear(self):
+        self._item = None
+        self._event.clear()
+
+
+class FrameWorker:
+    """Runs `process(item)` in a thread pool, always on the newest submitted item.
+
+    OpenCV releases the GIL, so decoding and vision in the pool leave the
+    asyncio/Qt loop free for I/O and painting. Items submitted while the
+    worker is busy overwrite each other and are counted in `dropped`.
+    An exception in `process` only skips its item: it is counted in
+    `errors` and passed to `on_error`, and the stream goes on.
+    """
+
+    def __init__(self, process, max_workers=1, on_error=None):
+        self.process = process
+        self.on_error = on_error
+        self.slot = LatestFrameSlot()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="frame-worker")
+        self.processed = 0
+        self.errors = 0
+
+    @property
+    def dropped(self):
+        return self.slot.dropped
+
+    def submit(self, item):
+        self.slot.put(item)
+
+    async def results(self):
+        """Yields (item, result) pairs; items whose result is None are skipped."""
+        loop = asyncio.get_event_loop()
+        while True:
+            item = await self.slot.get()
+            try:
+                result = await loop.run_in_executor(self.executor, self.process, item)
+            except Exception as e:
+                self.errors += 1
+                if self.on_error:
+                    self.on_error(e)
+                continue
+            self.processed += 1
+            if result is not None:
+                yield item, result
+
+    def stats(self):
+        return f"frames processed: {self.processed}, dropped (worker busy): {self.dropped}, errors: {self.errors}"
+
+    def reset(self):
+        self.slot.clear()
+
+    def shutdown(self):
+        self.slot.clear()
+        self.executor.shutdown(wait=False)
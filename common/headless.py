@@ -0,0 +1,168 @@
+import sys
+import time
+import signal
+import asyncio
+
+from common.connection import ConnectionManager
+from common.frame_source import MjpegHttpSource, open_source
+from common.frame_worker import FrameWorker
+from common.latency import LatencyTracker
+
+
+def add_common_args(parser, ws_url, video_url):
+    """Flags shared by the headless runners."""
+    parser.add_argument("--ws-url", default=ws_url, help="ESP32 command WebSocket")
+    parser.add_argument("--source", default=video_url,
+                        help="MJPEG URL, video file, folder of JPEGs or synthetic[:WxH]")
+    parser.add_argument("--fps", type=float, default=None, help="pace offline sources")
+    parser.add_argument("--loop", action="store_true", help="loop offline sources")
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="seconds between stats lines")
+    parser.add_argument("--dry-run", action="store_true", help="print commands instead of sending them")
+    parser.add_argument("--latency-export", default=None, help="write per-frame latency to .csv/.jsonl")
+    return parser
+
+
+class HeadlessRunner:
+    """Stream -> vision -> WebSocket command loop of a GUI, without Qt.
+
+    `process(frame)` runs in the frame worker thread and returns the list of
+    commands for that frame (or None to skip it). With `dedupe` a command
+    equal to the previous one is not sent again. `stop_commands` are sent
+    when the runner exits so the robot does not keep moving. `binary` sends
+    `common.protocol` frames (firmware with the binary protocol only).
+    """
+
+    def __init__(self, args, process, dedupe=False, stop_commands=("halt",), log=print, binary=False):
+        self.args = args
+        self.process = process
+        self.dedupe = dedupe
+        self.stop_commands = stop_commands
+        self.log = log
+
+        self.source = open_source(args.source, fps=args.fps, loop=args.loop)
+        self.live = isinstance(self.source, MjpegHttpSource)
+        self.connection = ConnectionManager(
+            args.ws_url, on_message=lambda msg: self.log(f"ESP32: {msg}"), log=self.log, binary=binary)
+        self.frame_worker = FrameWorker(process, on_error=lambda e: self.log(f"Frame error: {e}"))
+        self.latency = LatencyTracker(export_path=args.latency_export)
+
+        self.last_command = None
+        self.commands_sent = 0
+        self._stats_frames = 0
+        self._stats_sent = 0
+
+    async def send(self, command):
+        if self.args.dry_run:
+            self.log(f"Command (dry run): {command}")
+        elif not await self.connection.send(command):
+            return False
+        self.commands_sent += 1
+        return True
+
+    async def wait_connected(self, timeout=10.0):
+        deadline = time.perf_counter() + timeout
+        while not self.connection.connected:
+            if time.perf_counter() > deadline:
+                raise ConnectionError(f"WebSocket {self.args.ws_url} not connected after {timeout:.0f} s")
+            await asyncio.sleep(0.1)
+
+    async def run(self):
+        if not self.args.dry_run:
+            self.connection.start()
+            # A live ESP32 only streams after "start"; offline sources just need commands
+            await self.wait_connected()
+        consumer = asyncio.ensure_future(self.consume())
+        stats = asyncio.ensure_future(self.print_stats())
+        try:
+            if self.live:
+                await self.send("start")
+            async for frame in self.connection.stream(self.source):
+                self.frame_worker.submit(frame)
+            self.log("Source ended")
+        finally:
+            consumer.cancel()
+            stats.cancel()
+
+    async def consume(self):
+        try:
+            async for frame, commands in self.frame_worker.results():
+                sent = False
+                for command in commands:
+                    if self.dedupe and command == self.last_command:
+                        continue
+                    try:
+                        if not await self.send(command):
+                            continue
+                    except Exception as e:
+                        self.log(f"Send error ({command}): {e}")
+                        continue
+                    # Only a written command may suppress its repeats
+                    self.last_command = command
+                    sent = True
+                try:
+                    if sent:
+                        frame.mark("send")
+                    self.latency.record(frame)
+                except Exception as e:
+                    self.log(f"Frame error: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log(f"Frame worker error: {e}")
+
+    async def print_stats(self):
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.args.stats_interval)
+            now = time.perf_counter()
+            frames = self.latency.recorded - self._stats_frames
+            sent = self.commands_sent - self._stats_sent
+            self._stats_frames = self.latency.recorded
+            self._stats_sent = self.commands_sent
+            text = (f"{frames / (now - last):5.1f} fps, dropped {self.frame_worker.dropped}, "
+                    f"commands {sent} ({self.commands_sent} total)")
+            p = self.latency.percentiles("total")
+            if p is not None:
+                text += f", latency p50 {p[0]:.1f} / p95 {p[1]:.1f} ms"
+            self.log(text)
+            last = now
+
+    async def shutdown(self):
+        self.frame_worker.shutdown()
+        for command in self.stop_commands:
+            await self.send(command)
+        if self.live:
+            await self.send("stop")
+        self.log(self.frame_worker.stats())
+        self.log(self.connection.stats())
+        if self.latency.recorded:
+            self.log(self.latency.summary())
+        self.latency.close()
+        await self.connection.close()
+
+
+def run(runner):
+    """Run until the source ends, Ctrl+C or SIGTERM; the robot is halted on exit."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    task = loop.create_task(runner.run())
+    if sys.platform != "win32":
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+    except asyncio.CancelledError:
+        pass
+    except ConnectionError as e:
+        # No traceback for an unreachable ESP32; the halt/stop below is skipped while disconnected
+        sys.exit(str(e))
+    finally:
+        # Outside the cancelled task, so a repeated Ctrl+C/SIGTERM cannot cut the halt/stop short
+        loop.run_until_complete(runner.shutdown())
+        loop.close()
@@ -0,0 +1,94 @@
+import csv
+import json
+from collections import deque
+
+import cv2
+import numpy as np
+
+# Pipeline stages in order; each interval ends at the named stage
+STAGES = ("arrival", "parse", "decode", "vision", "send", "paint")
+
+
+class LatencyTracker:
+    """Rolling per-stage latency statistics of frames and optional export.
+
+    Every recorded frame contributes the time between consecutive stage
+    marks it has (e.g. decode = parse -> decode) and the end-to-end time
+    from chunk arrival to the last mark. With `end_stage` (e.g. "paint" in
+    the GUIs) frames that never reached it, such as frames the renderer
+    skipped, go to "skipped" instead of "total", so they do not pull the
+    end-to-end percentiles down. Rows can be written to a .csv or .jsonl
+    file for offline analysis.
+    """
+
+    def __init__(self, window=300, export_path=None, end_stage=None):
+        self.end_stage = end_stage
+        buckets = STAGES[1:] + ("total",) + (("skipped",) if end_stage else ())
+        self.samples = {name: deque(maxlen=window) for name in buckets}
+        self.recorded = 0
+        self.lines = []  # cached summary for the overlay, read from the worker thread
+        self._file = None
+        self._writer = None
+        if export_path:
+            self._open_export(export_path)
+
+    def _open_export(self, path):
+        self._file = open(path, "w", newline="")
+        if path.endswith(".csv"):
+            self._writer = csv.DictWriter(
+                self._file, fieldnames=["seq"] + [f"{s}_ms" for s in STAGES[1:]] + ["total_ms"]
+                + (["skipped_ms"] if self.end_stage else []))
+            self._writer.writeheader()
+
+    def record(self, frame):
+        marks = frame.marks
+        row = {"seq": frame.seq}
+        previous = marks["arrival"]
+        for stage in STAGES[1:]:
+            if stage in marks:
+                ms = (marks[stage] - previous) * 1000.0
+                self.samples[stage].append(ms)
+                row[f"{stage}_ms"] = round(ms, 3)
+                previous = marks[stage]
+        total = (previous - marks["arrival"]) * 1000.0
+        bucket = "skipped" if self.end_stage and self.end_stage not in marks else "total"
+        self.samples[bucket].append(total)
+        row[f"{bucket}_ms"] = round(total, 3)
+        self.recorded += 1
+        if self.recorded % 15 == 1:
+            self.lines = self.summary_lines()
+
+        if self._writer:
+            self._writer.writerow(row)
+        elif self._file:
+            self._file.write(json.dumps(row) + "\n")
+
+    def percentiles(self, name):
+        values = list(self.samples[name])
+        if not values:
+            return None
+        return np.percentile(values, [50, 95, 99])
+
+    def summary_lines(self):
+        lines = []
+        for name, values in self.samples.items():
+            if values:
+                p50, p95, p99 = self.percentiles(name)
+                lines.append(f"{name:<7} p50 {p50:6.1f}  p95 {p95:6.1f}  p99 {p99:6.1f} ms")
+        return lines
+
+    def summary(self):
+        return "Latency over the last frames:\n" + "\n".join(self.summary_lines())
+
+    def draw_overlay(self, image):
+        for i, line in enumerate(self.lines):
+            y = 14 + 14 * i
+            cv2.putText(image, line, (5, y), cv2.FONT_HERSHEY_PLAIN, 0.9, (0, 0, 0), 3)
+            cv2.putText(image, line, (5, y), cv2.FONT_HERSHEY_PLAIN, 0.9, (255, 255, 0), 1)
+        return image
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+            self._writer = None
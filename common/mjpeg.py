@@ -0,0 +1,126 @@
+import re
+
+DEFAULT_BOUNDARY = b"frame"
+MAX_HEADER_SIZE = 1024
+MAX_BUFFER_SIZE = 4 * 1024 * 1024
+
+_CONTENT_LENGTH_RE = re.compile(rb"content-length:\s*(\d+)", re.IGNORECASE)
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+
+
+def boundary_from_content_type(content_type, default=DEFAULT_BOUNDARY):
+    """Extract the boundary from `multipart/x-mixed-replace; boundary=frame`."""
+    if content_type:
+        match = _BOUNDARY_RE.search(content_type)
+        if match:
+            boundary = match.group(1).strip().encode("ascii")
+            return boundary[2:] if boundary.startswith(b"--") else boundary
+    return default
+
+
+class MjpegParser:
+    """Streaming parser for multipart MJPEG (multipart/x-mixed-replace).
+
+    Chunks are appended to one reusable bytearray; consumed data only moves
+    the read position and the buffer is compacted occasionally. The part size
+    comes from Content-Length, without it a part ends at the next boundary.
+    """
+
+    def __init__(self, boundary=DEFAULT_BOUNDARY, max_buffer=MAX_BUFFER_SIZE):
+        if isinstance(boundary, str):
+            boundary = boundary.encode("ascii")
+        self.delimiter = b"--" + boundary
+        self.max_buffer = max_buffer
+
+        self._buf = bytearray()
+        self._pos = 0
+        self._length = None  # body size of the current part, None while reading headers
+        self._until_boundary = False
+
+        self.frames = 0
+        self.bytes_in = 0
+        self.resyncs = 0
+
+    def reset(self):
+        self._buf.clear()
+        self._pos = 0
+        self._length = None
+        self._until_boundary = False
+
+    def buffered(self):
+        return len(self._buf) - self._pos
+
+    def feed(self, chunk):
+        """Append a chunk and return every complete JPEG frame (bytes)."""
+        self.bytes_in += len(chunk)
+        self._buf += chunk
+
+        frames = []
+        while True:
+            if self._length is None and not self._until_boundary:
+                if not self._parse_headers():
+                    break
+            frame = self._take_body()
+            if frame is None:
+                break
+            frames.append(frame)
+
+        self._compact()
+        self.frames += len(frames)
+        return frames
+
+    def _parse_headers(self):
+        buf = self._buf
+        start = buf.find(self.delimiter, self._pos)
+        if start == -1:
+            # Keep the tail in case the delimiter is split between chunks
+            keep = len(self.delimiter) - 1
+            if self.buffered() > keep:
+                self._pos = len(buf) - keep
+            return False
+
+        end = buf.find(b"\r\n\r\n", start)
+        if end == -1:
+            if len(buf) - start > MAX_HEADER_SIZE:
+                self.resyncs += 1
+                self._pos = start + len(self.delimiter)
+            else:
+                self._pos = start
+            return False
+
+        headers = bytes(buf[start:end])
+        self._pos = end + 4
+        match = _CONTENT_LENGTH_RE.search(headers)
+        if match:
+            self._length = int(match.group(1))
+        else:
+            self._until_boundary = True
+        return True
+
+    def _take_body(self):
+        buf = self._buf
+        if self._length is not None:
+            stop = self._pos + self._length
+            if len(buf) < stop:
+                return None
+            frame = bytes(memoryview(buf)[self._pos:stop])
+            self._pos = stop
+            self._length = None
+            return frame
+
+        stop = buf.find(b"\r\n" + self.delimiter, self._pos)
+        if stop == -1:
+            if self.buffered() > self.max_buffer:
+                self.resyncs += 1
+                self.reset()
+            return None
+        frame = bytes(memoryview(buf)[self._pos:stop])
+        self._pos = stop + 2
+        self._until_boundary = False
+        return frame
+
+    def _compact(self):
+        # Move data only once the consumed part is at least half of the buffer
+        if self._pos and self._pos * 2 >= len(self._buf):
+            del self._buf[:self._pos]
+            self._pos = 0
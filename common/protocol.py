@@ -0,0 +1,181 @@
+"""Compact binary command frames (protocol version 1), next to the text commands.
+
+A frame is 12 bytes, little-endian:
+
+    0     magic 0xA5 (never part of a text command, resyncs the serial link)
+    1     version
+    2     opcode
+    3-4   sequence number
+    5-6   value: angle, pan | tilt << 8 for PAN_TILT, the acknowledged opcode for ACK/NACK
+    7-10  send timestamp, ms (sender clock, wraps)
+    11    XOR of bytes 0-10
+
+The ESP32 acknowledges stream start/stop itself and forwards drive and
+servo frames to the Arduino, which sends the ACK after applying them. An
+ACK echoes the sequence number and timestamp of the command, so the sender
+gets the command-to-actuation latency without keeping its own clock table.
+"""
+import time
+import struct
+from collections import namedtuple
+
+MAGIC = 0xA5
+VERSION = 1
+FRAME = struct.Struct("<BBBHHIB")
+FRAME_LEN = FRAME.size
+
+OP_FORWARD = 0x01
+OP_BACKWARD = 0x02
+OP_LEFT = 0x03
+OP_RIGHT = 0x04
+OP_HALT = 0x05
+OP_PAN = 0x10
+OP_TILT = 0x11
+OP_PAN_TILT = 0x12
+OP_STREAM_START = 0x20
+OP_STREAM_STOP = 0x21
+OP_ACK = 0x80
+OP_NACK = 0x81
+
+TEXT_OPCODES = {
+    "w": OP_FORWARD,
+    "s": OP_BACKWARD,
+    "a": OP_LEFT,
+    "d": OP_RIGHT,
+    "halt": OP_HALT,
+    "start": OP_STREAM_START,
+    "stop": OP_STREAM_STOP,
+}
+OPCODE_TEXT = {opcode: text for text, opcode in TEXT_OPCODES.items()}
+
+Packet = namedtuple("Packet", "opcode seq value timestamp")
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def timestamp_ms():
+    return int(time.monotonic() * 1000) & 0xFFFFFFFF
+
+
+def _checksum(data):
+    checksum = 0
+    for byte in data:
+        checksum ^= byte
+    return checksum
+
+
+def encode(opcode, value=0, seq=0, timestamp=None):
+    timestamp = timestamp_ms() if timestamp is None else timestamp
+    body = FRAME.pack(MAGIC, VERSION, opcode, seq & 0xFFFF, value & 0xFFFF, timestamp & 0xFFFFFFFF, 0)[:-1]
+    return body + bytes([_checksum(body)])
+
+
+def decode(data):
+    if len(data) != FRAME_LEN:
+        raise ProtocolError(f"Frame of {len(data)} bytes, expected {FRAME_LEN}")
+    magic, version, opcode, seq, value, timestamp, checksum = FRAME.unpack(data)
+    if magic != MAGIC:
+        raise ProtocolError(f"Bad magic byte 0x{magic:02X}")
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    if checksum != _checksum(data[:-1]):
+        raise ProtocolError("Checksum mismatch")
+    return Packet(opcode, seq, value, timestamp)
+
+
+def _angle(text):
+    angle = int(text)
+    if not 0 <= angle <= 180:
+        raise ProtocolError(f"Servo angle out of range: {angle}")
+    return angle
+
+
+def from_text(command):
+    """(opcode, value) of a text command such as "w", "pan:90" or "pt:90,80"."""
+    if command in TEXT_OPCODES:
+        return TEXT_OPCODES[command], 0
+    name, _, argument = command.partition(":")
+    try:
+        if name == "pan":
+            return OP_PAN, _angle(argument)
+        if name == "tilt":
+            return OP_TILT, _angle(argument)
+        if name == "pt":
+            pan, tilt = argument.split(",")
+            return OP_PAN_TILT, _angle(pan) | _angle(tilt) << 8
+    except ValueError as e:
+        raise ProtocolError(f"Bad command {command!r}: {e}") from e
+    raise ProtocolError(f"Unknown command {command!r}")
+
+
+def to_text(opcode, value=0):
+    """Text form of a command opcode, e.g. for logs."""
+    if opcode in OPCODE_TEXT:
+        return OPCODE_TEXT[opcode]
+    if opcode == OP_PAN:
+        return f"pan:{value}"
+    if opcode == OP_TILT:
+        return f"tilt:{value}"
+    if opcode == OP_PAN_TILT:
+        return f"pt:{value & 0xFF},{value >> 8}"
+    return f"op:0x{opcode:02X}"
+
+
+def encode_text(command, seq, timestamp=None):
+    opcode, value = from_text(command)
+    return encode(opcode, value, seq, timestamp)
+
+
+class AckTracker:
+    """Matches ACK/NACK frames to sent commands by sequence number.
+
+    The latency of an ACK is the time since the echoed send timestamp.
+    Commands without an answer after `timeout` seconds count as lost.
+    """
+
+    def __init__(self, timeout=2.0, window=200):
+        self.timeout = timeout
+        self.window = window
+        self._pending = {}  # seq -> (sent_at, command)
+        self.latencies = []
+        self.acked = 0
+        self.nacked = 0
+        self.lost = 0
+        self.unexpected = 0
+
+    def sent(self, seq, command):
+        self._expire()
+        self._pending[seq] = (time.monotonic(), command)
+
+    def received(self, packet):
+        """Handles an ACK/NACK; returns (command, latency_ms) or None for an unknown sequence."""
+        entry = self._pending.pop(packet.seq, None)
+        if entry is None:
+            self.unexpected += 1
+            return None
+        latency_ms = float((timestamp_ms() - packet.timestamp) & 0xFFFFFFFF)
+        if packet.opcode == OP_NACK:
+            self.nacked += 1
+        else:
+            self.acked += 1
+            self.latencies = (self.latencies + [latency_ms])[-self.window:]
+        return entry[1], latency_ms
+
+    def _expire(self):
+        deadline = time.monotonic() - self.timeout
+        for seq in [seq for seq, (sent_at, _) in self._pending.items() if sent_at < deadline]:
+            del self._pending[seq]
+            self.lost += 1
+
+    def stats(self):
+        self._expire()
+        text = (f"Acks: {self.acked} acked, {self.nacked} rejected, {self.lost} lost, "
+                f"{len(self._pending)} waiting")
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            text += f", command-to-actuation p50 {p50:.0f} / p95 {p95:.0f} ms"
+        return text
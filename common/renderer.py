@@ -0,0 +1,91 @@
+import time
+
+from PyQt5 import QtGui, QtCore
+
+DEFAULT_FPS = 60
+
+
+class FrameRenderer(QtCore.QObject):
+    """Paints the newest RGB frame into a QLabel at display rate.
+
+    Frames that arrive between two timer ticks replace each other and only
+    the last one is painted. The target size is cached until `resize()` is
+    called, painting falls back to fast scaling while the renderer is behind
+    and stops while the window is minimized.
+    """
+
+    def __init__(self, label, fps=None, parent=None, on_done=None):
+        super().__init__(parent or label)
+        self.label = label
+        self.on_done = on_done  # called with the frame meta once painted or skipped
+        if fps is None:
+            screen = QtGui.QGuiApplication.primaryScreen()
+            fps = screen.refreshRate() if screen and screen.refreshRate() > 0 else DEFAULT_FPS
+        self.interval_ms = max(1, int(1000 / fps))
+
+        self._pending = None
+        self._pending_meta = None
+        self._last = None
+        self._target_size = None
+        self._behind = False
+
+        self.rendered = 0
+        self.skipped = 0
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.timeout.connect(self._paint)
+        self.timer.start(self.interval_ms)
+
+    def set_frame(self, frame, meta=None):
+        if self._pending is not None:
+            self.skipped += 1
+            self._behind = True
+            self._done(self._pending_meta)
+        self._pending = frame
+        self._pending_meta = meta
+
+    def _done(self, meta):
+        if meta is not None and self.on_done:
+            self.on_done(meta)
+
+    def resize(self):
+        # Read the size on the next paint, after the layout has settled
+        self._target_size = None
+        if self._pending is None and self._last is not None:
+            self._pending = self._last
+
+    def clear(self):
+        self._pending = None
+        self._pending_meta = None
+        self._last = None
+        self.label.clear()
+
+    def stats(self):
+        return f"frames rendered: {self.rendered}, skipped: {self.skipped}"
+
+    def _paint(self):
+        frame = self._pending
+        if frame is None:
+            return
+        window = self.label.window()
+        if window.isMinimized() or not self.label.isVisible():
+            return
+        meta, self._pending, self._pending_meta = self._pending_meta, None, None
+
+        start = time.perf_counter()
+        if self._target_size is None:
+            self._target_size = self.label.size()
+        # QImage only wraps the array, `_last` keeps it alive until the next frame
+        image = QtGui.QImage(frame.data, frame.shape[1], frame.shape[0],
+                             frame.strides[0], QtGui.QImage.Format_RGB888)
+        mode = QtCore.Qt.FastTransformation if self._behind else QtCore.Qt.SmoothTransformation
+        pix = QtGui.QPixmap.fromImage(image).scaled(self._target_size, QtCore.Qt.KeepAspectRatio, mode)
+        self.label.setPixmap(pix)
+        self._last = frame
+        self.rendered += 1
+        if meta is not None:
+            meta.mark("paint")
+            self._done(meta)
+
+        self._behind = (time.perf_counter() - start) * 1000 > self.interval_ms
@@ -0,0 +1,68 @@
+import time
+import asyncio
+
+
+class ServoScheduler:
+    """Coalesces pan/tilt updates into at most `rate` messages per second.
+
+    Only the latest value per axis is kept; a value replaced before it went
+    out counts as coalesced. After an idle period the first update is sent
+    at once, the following ones wait for the next slot. With `combine` both
+    axes go out as one "pt:PAN,TILT" message (the other axis repeats its
+    last value). `send` is an async callable taking the message and
+    returning True if it was written; only those count as sent.
+    """
+
+    AXES = ("pan", "tilt")
+
+    def __init__(self, send, rate=20.0, combine=False, pan=90, tilt=90):
+        self.send = send
+        self.interval = 1.0 / rate if rate else 0.0
+        self.combine = combine
+        self.values = {"pan": pan, "tilt": tilt}
+
+        self._pending = {}
+        self._task = None
+        self._last_flush = -float("inf")
+
+        self.requested = 0
+        self.coalesced = 0
+        self.sent = 0
+
+    def set(self, axis, value):
+        if axis not in self.AXES:
+            raise ValueError(f"Unknown servo axis: {axis}")
+        self.requested += 1
+        if axis in self._pending:
+            self.coalesced += 1
+        self._pending[axis] = int(value)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    def _messages(self, pending):
+        self.values.update(pending)
+        if self.combine:
+            return [f"pt:{self.values['pan']},{self.values['tilt']}"]
+        return [f"{axis}:{value}" for axis, value in pending.items()]
+
+    async def _flush_loop(self):
+        while self._pending:
+            delay = self._last_flush + self.interval - time.monotonic()
+            if delay > 0:
+                # Updates arriving meanwhile replace the pending values
+                await asyncio.sleep(delay)
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+            for message in self._messages(pending):
+                if await self.send(message):
+                    self.sent += 1
+
+    def stats(self):
+        return (f"Servo updates: {self.requested} requested, {self.sent} messages written, "
+                f"{self.coalesced} coalesced")
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._pending.clear()
@@ -0,0 +1,239 @@
+"""Headless end-to-end benchmark of the lab pipelines against the ESP32 emulator.
+
+    python tools/benchmark_pipeline.py --lab all --emulator --fps 30 --duration 10
+
+Each lab pipeline (stream -> decode -> vision -> WebSocket command) runs
+without Qt, with the same latest-frame-wins worker as the GUIs, and reports
+throughput, per-stage latency percentiles and per-stage CPU time.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import subprocess
+
+import cv2
+import numpy as np
+import websockets
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "Lab_2"))
+sys.path.append(os.path.join(ROOT, "Lab_3_2"))
+from common.frame_source import MjpegHttpSource  # noqa: E402
+from common.frame_worker import FrameWorker  # noqa: E402
+import line_detection  # noqa: E402
+
+LABS = ("lab1_2", "lab2", "lab3_1", "lab3_2")
+
+
+class StageTimer:
+    """Wall and thread CPU time of named stages of one frame."""
+
+    def __init__(self):
+        self.wall = {}
+        self.cpu = {}
+
+    def run(self, stage, fn, *args):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        result = fn(*args)
+        self.wall[stage] = (time.perf_counter() - wall) * 1000.0
+        self.cpu[stage] = (time.thread_time() - cpu) * 1000.0
+        return result
+
+
+# -------------------------- Lab pipelines (run in the worker) --------------------------
+def video_pipeline(frame):
+    timer = StageTimer()
+    image = timer.run("decode", frame.decode)
+    timer.run("convert", cv2.cvtColor, image, cv2.COLOR_BGR2RGB)
+    return timer, []
+
+
+def line_pipeline(frame, fast=True, scale=2):
+    timer = StageTimer()
+    if fast:
+        gray = timer.run("decode", frame.decode_gray, scale)
+        command, _ = timer.run("vision", line_detection.process_gray_fast, gray, scale)
+    else:
+        image = timer.run("decode", frame.decode)
+        command, _ = timer.run("vision", line_detection.process_frame, image)
+    return timer, [command or "halt"]
+
+
+class YoloPipeline:
+    """The Lab 3.2 tracking loop with the GUI_YOLO_tracking.py defaults.
+
+    Adaptive input size, ROI windows, the motion gate and optical flow
+    between detections, then the multi-object tracker, the target lock
+    and the PID pan/tilt controller.
+    """
+
+    def __init__(self, model_path, backend="torch", imgsz=320, target="cell phone"):
+        from detectors import AdaptiveImgszDetector, MotionGatedDetector, load_detector, make_detector
+        from object_tracker import MultiObjectTracker, TargetLock
+        from pan_tilt_control import PanTiltController
+        from tracking import HybridDetector, RoiDetector
+
+        self.detector, self.load_ms, _, _ = load_detector(
+            lambda: make_detector(backend, model_path, imgsz=imgsz, conf=0.1, dynamic=True), imgsz)
+        self.roi = RoiDetector(AdaptiveImgszDetector(self.detector, start=imgsz), target=target, min_conf=0.5)
+        self.hybrid = HybridDetector(MotionGatedDetector(self.roi), target=target, min_conf=0.5)
+        self.mot = MultiObjectTracker()
+        self.target_lock = TargetLock(target=target)
+        self.pan_tilt = PanTiltController()
+
+    def track(self, detections, frame_shape):
+        target = self.target_lock.update(self.mot.update(detections), self.detector.names)
+        box = None if target is None else target.box
+        self.roi.set_target(box)
+        self.hybrid.set_target(box)
+        if target is None:
+            self.pan_tilt.reset()
+        if target is None or target.time_since_update:
+            return []
+        return self.pan_tilt.move_towards(target.box, frame_shape)
+
+    def __call__(self, frame):
+        timer = StageTimer()
+        image = timer.run("decode", frame.decode)
+        detections = timer.run("vision", self.hybrid.detect, image)
+        commands = timer.run("track", self.track, detections, image.shape)
+        return timer, commands
+
+    def close(self):
+        self.detector.close()
+
+
+# -------------------------- Runner --------------------------
+def percentiles(values):
+    if not values:
+        return "      -       -       -"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"{p50:7.2f} {p95:7.2f} {p99:7.2f}"
+
+
+async def run_lab(name, process, video_url, ws_url, duration):
+    ws = await websockets.connect(ws_url)
+    await ws.send("start")
+
+    wall, cpu, latency = {}, {}, []
+    stats = {"results": 0, "commands": 0, "sent": 0}
+    last_command = None
+    worker = FrameWorker(process)
+
+    async def consume():
+        nonlocal last_command
+        async for frame, (timer, commands) in worker.results():
+            stats["results"] += 1
+            for stage, ms in timer.wall.items():
+                wall.setdefault(stage, []).append(ms)
+                cpu.setdefault(stage, []).append(timer.cpu[stage])
+            for command in commands:
+                stats["commands"] += 1
+                if command == last_command:
+                    continue
+                start = time.perf_counter()
+                await ws.send(command)
+                wall.setdefault("send", []).append((time.perf_counter() - start) * 1000.0)
+                stats["sent"] += 1
+                last_command = command
+            latency.append((time.perf_counter() - frame.timestamp) * 1000.0)
+
+    async def drain_logs():
+        async for _ in ws:
+            pass
+
+    consumer = asyncio.ensure_future(consume())
+    logs = asyncio.ensure_future(drain_logs())
+    received = 0
+    start = time.perf_counter()
+    try:
+        async for frame in MjpegHttpSource(video_url).frames():
+            received += 1
+            worker.submit(frame)
+            if time.perf_counter() - start > duration:
+                break
+    finally:
+        elapsed = time.perf_counter() - start
+        consumer.cancel()
+        logs.cancel()
+        worker.shutdown()
+        await ws.send("stop")
+        await ws.close()
+
+    print(f"\n=== {name} ===")
+    print(f"received {received / elapsed:6.1f} fps, processed {stats['results'] / elapsed:6.1f} fps, "
+          f"dropped {worker.dropped}, commands {stats['commands']} (sent {stats['sent']})")
+    print(f"{'stage':<12} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'cpu ms':>7}")
+    for stage, values in wall.items():
+        mean_cpu = f"{np.mean(cpu[stage]):7.2f}" if stage in cpu else "      -"
+        print(f"{stage:<12} {percentiles(values)} {mean_cpu}")
+    print(f"{'end-to-end':<12} {percentiles(latency)}")
+
+
+def start_emulator(args):
+    cmd = [sys.executable, os.path.join(ROOT, "tools", "esp32_emulator.py"),
+           "--source", args.source, "--fps", str(args.fps), "--resolution", args.resolution,
+           "--http-port", str(args.http_port), "--ws-port", str(args.ws_port)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in proc.stdout:
+        if "ESP32 ready" in line:
+            # Keep draining the log so the emulator never blocks on a full pipe
+            threading.Thread(target=proc.stdout.read, daemon=True).start()
+            return proc
+    raise RuntimeError("Emulator did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end lab pipeline benchmark")
+    parser.add_argument("--lab", default="all", choices=LABS + ("all",))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per lab")
+    parser.add_argument("--video-url", default=None, help="default: the local emulator")
+    parser.add_argument("--ws-url", default=None, help="default: the local emulator")
+    parser.add_argument("--emulator", action="store_true", help="start tools/esp32_emulator.py")
+    parser.add_argument("--source", default="synthetic", help="emulator frames")
+    parser.add_argument("--fps", type=float, default=20.0, help="emulator stream rate")
+    parser.add_argument("--resolution", default="320x240", help="emulator resolution")
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--ws-port", type=int, default=8081)
+    parser.add_argument("--line-mode", default="fast", choices=("fast", "full"))
+    parser.add_argument("--model", default=os.path.join(ROOT, "Lab_3_2", "yolov8n.pt"))
+    parser.add_argument("--backend", default="torch", choices=("torch", "onnx", "openvino"))
+    args = parser.parse_args()
+
+    video_url = args.video_url or f"http://127.0.0.1:{args.http_port}/video"
+    ws_url = args.ws_url or f"ws://127.0.0.1:{args.ws_port}/ws"
+    emulator = start_emulator(args) if args.emulator else None
+
+    labs = LABS if args.lab == "all" else (args.lab,)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        for lab in labs:
+            if lab in ("lab1_2", "lab3_1"):
+                process = video_pipeline
+            elif lab == "lab2":
+                process = lambda frame: line_pipeline(frame, fast=args.line_mode == "fast")  # noqa: E731
+            else:
+                try:
+                    process = YoloPipeline(args.model, args.backend)
+                except Exception as e:
+                    # Missing ultralytics/runtime, or weights that cannot be downloaded
+                    print(f"\n=== lab3_2 === skipped: model not loaded ({type(e).__name__}: {e})")
+                    continue
+            try:
+                loop.run_until_complete(run_lab(lab, process, video_url, ws_url, args.duration))
+            finally:
+                if isinstance(process, YoloPipeline):
+                    process.close()
+    finally:
+        if emulator:
+            emulator.terminate()
+            emulator.wait()
+
+
+if __name__ == "__main__":
+    main()
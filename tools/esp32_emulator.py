@@ -0,0 +1,279 @@
+"""Local stand-in for the ESP32-CAM firmware (Lab_*/Firmware/ESP32_CAM_*).
+
+Serves the MJPEG stream on `/video` and the command WebSocket on `/ws`
+like the real board, replaying recorded or synthetic frames:
+
+    python tools/esp32_emulator.py --source synthetic --fps 20 --resolution 320x240
+    python tools/esp32_emulator.py --source recording/ --http-port 8080 --ws-port 8081
+
+Then point ESP32_VIDEO_URL / ESP32_WS_URL of a GUI to
+http://127.0.0.1:8080/video and ws://127.0.0.1:8081/ws.
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import argparse
+
+import cv2
+from aiohttp import web, WSMsgType
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import protocol  # noqa: E402
+from common.frame_source import SyntheticSource, open_source  # noqa: E402
+
+SERIAL_BAUD = 9600  # ESP32 <-> Arduino UART in the firmware
+DRIVE_COMMANDS = {"w", "a", "s", "d", "halt"}
+
+
+def to_int(text):
+    """String.toInt() of the firmware: the leading integer, 0 when there is none."""
+    match = re.match(r"\s*[-+]?\d+", text)
+    return int(match.group()) if match else 0
+
+
+class Esp32Emulator:
+    def __init__(self, frames, fps):
+        self.frames = frames
+        self.fps = fps
+        self.stream_active = False
+        self.clients = set()
+
+        self.pan = 90
+        self.tilt = 90
+        self.motion = "halt"
+
+        self.frames_sent = 0
+        self.commands = {}
+
+    # -------------------------- Logging --------------------------
+    async def send_log(self, msg):
+        print(msg)
+        for ws in list(self.clients):
+            try:
+                await ws.send_str(msg)
+            except ConnectionError:
+                self.clients.discard(ws)
+
+    async def send_frame(self, frame):
+        for ws in list(self.clients):
+            try:
+                await ws.send_bytes(frame)
+            except ConnectionError:
+                self.clients.discard(ws)
+
+    # -------------------------- Arduino --------------------------
+    async def send_to_arduino(self, msg):
+        # Serial1.println + flush: blocks for the UART transfer (10 bits per byte)
+        tx_time = (len(msg) + 2) * 10 / SERIAL_BAUD
+        await asyncio.sleep(tx_time)
+        await self.send_log("Sent to Arduino -> " + msg)
+        self.apply(msg)
+        asyncio.ensure_future(self.arduino_echo(msg, tx_time))
+
+    def apply(self, msg):
+        if msg in DRIVE_COMMANDS:
+            self.motion = msg
+        elif msg.startswith("pan:"):
+            self.pan = max(0, min(180, to_int(msg[4:])))
+        elif msg.startswith("tilt:"):
+            self.tilt = max(0, min(180, to_int(msg[5:])))
+        elif msg.startswith("pt:"):
+            pan, tilt = msg[3:].split(",")
+            self.pan, self.tilt = max(0, min(180, to_int(pan))), max(0, min(180, to_int(tilt)))
+
+    async def frame_to_arduino(self, packet):
+        # Serial1.write of the raw frame; the Arduino acks once the command is applied
+        tx_time = protocol.FRAME_LEN * 10 / SERIAL_BAUD
+        await asyncio.sleep(tx_time)
+        self.apply(protocol.to_text(packet.opcode, packet.value))
+        asyncio.ensure_future(self.arduino_ack(packet, tx_time))
+
+    async def arduino_ack(self, packet, tx_time):
+        await asyncio.sleep(tx_time)
+        await self.send_frame(protocol.encode(protocol.OP_ACK, packet.opcode, packet.seq, packet.timestamp))
+
+    async def arduino_echo(self, msg, tx_time):
+        # The Arduino prints every handled line back
+        await asyncio.sleep(tx_time)
+        await self.send_log("Received from Arduino -> " + msg)
+
+    # -------------------------- WebSocket --------------------------
+    async def handle_command(self, data):
+        data = data.strip()
+        key = data.split(":", 1)[0]
+        self.commands[key] = self.commands.get(key, 0) + 1
+
+        if data == "start":
+            self.stream_active = True
+            await self.send_log("Streaming enabled")
+        elif data == "stop":
+            self.stream_active = False
+            await self.send_log("Streaming disabled")
+        elif data in DRIVE_COMMANDS:
+            await self.send_to_arduino(data)
+        elif data.startswith(("pan:", "tilt:")):
+            value = data.split(":", 1)[1]
+            angle = to_int(value)
+            if 0 <= angle <= 180:
+                await self.send_to_arduino(data)
+            else:
+                await self.send_log("Invalid servo angle: " + value)
+        elif data.startswith("pt:"):
+            angles = [to_int(v) for v in data[3:].split(",")]
+            if len(angles) == 2 and all(0 <= a <= 180 for a in angles):
+                await self.send_to_arduino(data)
+            else:
+                await self.send_log("Invalid servo angles: " + data)
+        else:
+            await self.send_log("Unknown command: " + data)
+
+    async def handle_frame(self, data):
+        try:
+            packet = protocol.decode(data)
+            command = protocol.to_text(packet.opcode, packet.value)
+        except protocol.ProtocolError as e:
+            await self.send_log(f"Invalid binary frame: {e}")
+            return
+        key = command.split(":", 1)[0]
+        self.commands[key] = self.commands.get(key, 0) + 1
+
+        if packet.opcode in (protocol.OP_STREAM_START, protocol.OP_STREAM_STOP):
+            self.stream_active = packet.opcode == protocol.OP_STREAM_START
+            await self.send_log("Streaming enabled" if self.stream_active else "Streaming disabled")
+            await self.send_frame(protocol.encode(protocol.OP_ACK, packet.opcode, packet.seq, packet.timestamp))
+            return
+        try:
+            protocol.from_text(command)  # angle range, known opcode
+        except protocol.ProtocolError:
+            await self.send_frame(protocol.encode(protocol.OP_NACK, packet.opcode, packet.seq, packet.timestamp))
+            return
+        await self.frame_to_arduino(packet)
+
+    async def ws_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.clients.add(ws)
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    await self.handle_command(msg.data)
+                elif msg.type == WSMsgType.BINARY:
+                    await self.handle_frame(msg.data)
+        finally:
+            self.clients.discard(ws)
+        return ws
+
+    # -------------------------- MJPEG --------------------------
+    async def video_handler(self, request):
+        resp = web.StreamResponse(headers={
+            "Content-Type": "multipart/x-mixed-replace; boundary=frame",
+            "Connection": "close",
+        })
+        await resp.prepare(request)
+        await self.send_log("MJPEG client connected")
+        self.stream_active = True
+
+        index = 0
+        next_time = time.perf_counter()
+        try:
+            while True:
+                if not self.stream_active:
+                    await asyncio.sleep(0.1)  # Idle
+                    next_time = time.perf_counter()
+                    continue
+                jpeg = self.frames[index % len(self.frames)]
+                index += 1
+                await resp.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                 b"Content-Length: %d\r\n\r\n" % len(jpeg) + jpeg + b"\r\n")
+                self.frames_sent += 1
+
+                next_time += 1.0 / self.fps
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    next_time = time.perf_counter()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        return resp
+
+    def stats(self):
+        return f"frames sent: {self.frames_sent}, commands: {self.commands}"
+
+
+def load_frames(source, width, height, limit, quality):
+    """Pre-encode frames so serving them costs no CPU."""
+    async def collect():
+        if source == "synthetic":
+            src = SyntheticSource(width, height, count=limit, encode=False)
+        else:
+            src = open_source(source)
+        frames = []
+        async for frame in src.frames():
+            image = frame.decode()
+            if image.shape[1] != width or image.shape[0] != height:
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            frames.append(jpeg.tobytes())
+            if len(frames) >= limit:
+                break
+        return frames
+    return asyncio.get_event_loop().run_until_complete(collect())
+
+
+async def serve(emulator, host, http_port, ws_port):
+    video_app = web.Application()
+    video_app.router.add_get("/video", emulator.video_handler)
+    ws_app = web.Application()
+    ws_app.router.add_get("/ws", emulator.ws_handler)
+
+    runners = []
+    for app, port in ((video_app, http_port), (ws_app, ws_port)):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        runners.append(runner)
+    print(f"MJPEG stream: http://{host}:{http_port}/video")
+    print(f"WebSocket:    ws://{host}:{ws_port}/ws")
+    print("ESP32 ready")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ESP32-CAM firmware emulator")
+    parser.add_argument("--source", default="synthetic",
+                        help='"synthetic", a video file or a folder of JPEG frames')
+    parser.add_argument("--fps", type=float, default=20.0, help="stream rate (firmware: ~20)")
+    parser.add_argument("--resolution", default="320x240", help="WxH, firmware uses QVGA")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality of re-encoded frames")
+    parser.add_argument("--max-frames", type=int, default=300, help="frames kept in the replay loop")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=8080, help="/video port (firmware: 80)")
+    parser.add_argument("--ws-port", type=int, default=8081, help="/ws port (firmware: 81)")
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.lower().split("x"))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    frames = load_frames(args.source, width, height, args.max_frames, args.quality)
+    if not frames:
+        sys.exit("No frames to serve")
+    print(f"{len(frames)} frames {width}x{height} at {args.fps:g} fps")
+
+    emulator = Esp32Emulator(frames, args.fps)
+    try:
+        loop.run_until_complete(serve(emulator, args.host, args.http_port, args.ws_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(emulator.stats())
+
+
+if __name__ == "__main__":
+    main()